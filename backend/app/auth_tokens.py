@@ -0,0 +1,131 @@
+"""
+Bearer token verification for Supabase Auth access tokens.
+
+Tokens are verified locally (signature, ``exp``, ``aud``) against the project's
+legacy JWT secret (HS256) or its published signing keys (JWKS, asymmetric).
+The remote ``/auth/v1/user`` check is only used when no local key can verify
+the token, which is what happens right after a signing key rotates.
+"""
+import time
+from uuid import UUID
+
+import httpx
+import jwt
+
+from app.config import get_settings
+
+# Don't hammer the JWKS endpoint when tokens carry an unknown kid.
+JWKS_MIN_REFRESH_SECONDS = 60.0
+
+_http: httpx.AsyncClient | None = None
+_jwks: dict[str, jwt.PyJWK] = {}
+_jwks_fetched_at = 0.0
+
+
+class _KeyUnavailable(Exception):
+    """No local key can check this token's signature."""
+
+
+def _get_http() -> httpx.AsyncClient:
+    global _http
+    if _http is None:
+        _http = httpx.AsyncClient(timeout=15.0)
+    return _http
+
+
+async def _refresh_jwks() -> None:
+    global _jwks, _jwks_fetched_at
+    if time.monotonic() - _jwks_fetched_at < JWKS_MIN_REFRESH_SECONDS:
+        return
+    _jwks_fetched_at = time.monotonic()
+    settings = get_settings()
+    url = f"{settings.supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json"
+    try:
+        r = await _get_http().get(url)
+        r.raise_for_status()
+        keys = r.json().get("keys", [])
+    except (httpx.HTTPError, ValueError):
+        return
+    refreshed: dict[str, jwt.PyJWK] = {}
+    for key in keys:
+        try:
+            refreshed[key["kid"]] = jwt.PyJWK(key)
+        except (KeyError, jwt.PyJWTError):
+            continue
+    _jwks = refreshed
+
+
+async def _signing_key(token: str) -> tuple[object, str]:
+    header = jwt.get_unverified_header(token)
+    alg = header.get("alg")
+    if alg == "HS256":
+        secret = get_settings().supabase_jwt_secret
+        if not secret:
+            raise _KeyUnavailable()
+        return secret, alg
+    kid = header.get("kid")
+    if not isinstance(kid, str) or not kid:
+        raise _KeyUnavailable()
+    if kid not in _jwks:
+        await _refresh_jwks()
+    if kid not in _jwks:
+        raise _KeyUnavailable()
+    # The algorithm comes from the published key, never from the token header
+    jwk = _jwks[kid]
+    if alg != jwk.algorithm_name:
+        raise jwt.InvalidAlgorithmError(f"Token alg {alg!r} does not match key {kid!r}")
+    return jwk.key, jwk.algorithm_name
+
+
+def _decode(token: str, key: object, alg: str) -> UUID:
+    settings = get_settings()
+    payload = jwt.decode(
+        token,
+        key,  # pyright: ignore[reportArgumentType]
+        algorithms=[alg],
+        audience=settings.supabase_jwt_audience,
+        options={"require": ["exp", "sub"]},
+    )
+    return UUID(payload["sub"])
+
+
+async def _verify_remotely(token: str) -> UUID | None:
+    settings = get_settings()
+    url = f"{settings.supabase_url.rstrip('/')}/auth/v1/user"
+    try:
+        r = await _get_http().get(
+            url,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "apikey": settings.supabase_anon_key,
+            },
+        )
+    except httpx.RequestError:
+        return None
+    if r.status_code != 200:
+        return None
+    try:
+        uid = r.json().get("id")
+        return UUID(uid) if uid else None
+    except (ValueError, TypeError):
+        return None
+
+
+async def verify_access_token(token: str) -> UUID | None:
+    """Return the user id of a valid access token, or None if it is invalid or expired."""
+    try:
+        key, alg = await _signing_key(token)
+    except _KeyUnavailable:
+        return await _verify_remotely(token)
+    except jwt.PyJWTError:
+        return None
+    try:
+        return _decode(token, key, alg)
+    except jwt.InvalidSignatureError:
+        if alg == "HS256":
+            # The project secret may have been rotated since this process started.
+            return await _verify_remotely(token)
+        return None
+    except Exception:
+        # Any other failure (bad claims, a key the library rejects) is a 401, not a 500
+        return None
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Literal
 
 
 class Settings(BaseSettings):
@@ -7,6 +8,13 @@ class Settings(BaseSettings):
     supabase_url: str
     supabase_service_key: str
     supabase_anon_key: str
+    # Settings → API → JWT Secret; verifies legacy HS256 tokens locally.
+    # Asymmetric signing keys are fetched from the project's JWKS endpoint.
+    supabase_jwt_secret: str | None = None
+    supabase_jwt_audience: str = "authenticated"
+    # Optional direct Postgres connection (Settings → Database → Connection string).
+    # When set, chunk rows are written with COPY; needs psycopg installed.
+    database_url: str | None = None
 
     # CORS (comma-separated origins, e.g. https://ta-i.vercel.app,http://localhost:3000)
     cors_origins: str = "http://localhost:3000,https://ta-i.vercel.app"
@@ -16,10 +24,92 @@ class Settings(BaseSettings):
     
     # App settings (legacy list unused; use cors_origins string above)
     embedding_model: str = "text-embedding-3-small"
+    # Shortened text-embedding-3 output (e.g. 512; None = native 1536). Has to match the
+    # chunks.embedding column: resize it with `python -m tools.backfill_embeddings`
+    embedding_dimensions: int | None = None
     chat_model: str = "gpt-4o-mini"
+    # Settle deterministic hint-controller decisions (assessment mode, escalation,
+    # keyword-detected requests) without a model call; ambiguous messages still use it
+    hint_pre_controller: bool = True
+    # "multi_call": topic tagger, hint controller and assistant are separate completions.
+    # "single_shot": one structured-output completion returns all three, unless
+    # the pre-controller settles the turn or the completion fails
+    chat_mode: Literal["multi_call", "single_shot"] = "multi_call"
     chunk_size: int = 400  # target tokens per chunk
     chunk_overlap: int = 50
+    # "paragraph": legacy blank-line packing. "structured": exact token windows with
+    # chunk_overlap, split at Markdown headings/lists/code fences, with page and offsets
+    chunking_mode: Literal["paragraph", "structured"] = "paragraph"
     retrieval_top_k: int = 5
+    # Per-query ANN search effort (None = server default: ef_search 40, probes 1).
+    # Chunks are partitioned per course, so ef_search only needs to exceed retrieval_top_k.
+    retrieval_hnsw_ef_search: int | None = None
+    retrieval_ivfflat_probes: int | None = None
+    # Relevance gate (adaptive top-k): drop rows under retrieval_min_similarity and cut
+    # the ranking at the first similarity drop above retrieval_max_score_gap (None = no
+    # cut). Off-topic questions then retrieve nothing and are refused without an LLM call
+    retrieval_min_similarity: float = 0.2
+    retrieval_max_score_gap: float | None = 0.15
+    # Hybrid mode: full-text hits may sit below retrieval_min_similarity (an exact
+    # identifier match can embed poorly) but not below this floor. Query terms are
+    # OR-ed, so one common word would otherwise let an off-topic question through
+    retrieval_lexical_min_similarity: float = 0.15
+    # "vector": cosine similarity only. "hybrid": vector and full-text rankings
+    # (top retrieval_hybrid_candidates of each) fused by reciprocal rank
+    retrieval_mode: Literal["vector", "hybrid"] = "vector"
+    retrieval_hybrid_candidates: int = 40
+    retrieval_rrf_k: int = 60
+    # Re-ranking: fetch this many candidates (0 = off) and keep retrieval_top_k by
+    # Maximal Marginal Relevance, trading relevance against redundancy
+    retrieval_rerank_candidates: int = 0
+    retrieval_mmr_lambda: float = 0.7  # 1 = relevance only, 0 = diversity only
+    # Local CPU cross-encoder for the relevance term, e.g. cross-encoder/ms-marco-MiniLM-L-6-v2
+    # (needs sentence-transformers); unset = cosine similarity
+    retrieval_cross_encoder_model: str | None = None
+    # In-process vector index: a course's embeddings cached as a memory-mapped float32
+    # .npy under local_index_dir and searched in NumPy instead of the match_chunks RPC
+    # (vector mode only). Courses over local_index_max_chunks stay on pgvector
+    local_index_enabled: bool = False
+    local_index_dir: str = ".vector_index"
+    local_index_max_chunks: int = 20_000
+    local_index_max_courses: int = 64  # kept mapped per worker
+    # Store the local index as int8 with a scale per row: a quarter of the float32 size
+    local_index_int8: bool = False
+
+    # Background ingestion
+    ingestion_workers: int = 2
+    # Pipeline: chunks per embed/insert batch, batches buffered between stages,
+    # PDF pages chunked together (chunks still span pages within a window)
+    ingestion_batch_size: int = 64
+    ingestion_queue_size: int = 4
+    ingestion_window_pages: int = 8
+    # PostgREST chunk inserts are split to stay under request size limits
+    chunk_insert_max_bytes: int = 4 * 1024 * 1024
+    chunk_insert_max_rows: int = 500
+    max_upload_bytes: int = 50 * 1024 * 1024
+    pdf_extract_workers: int = 4  # processes; 1 = parse in the calling thread
+    pdf_parallel_min_pages: int = 24
+
+    # Chunk embedding: token-packed batches, run concurrently, retried on 429/5xx
+    embedding_batch_max_tokens: int = 100_000  # API limit is 300k tokens per request
+    embedding_batch_max_inputs: int = 512  # API limit is 2048
+    embedding_concurrency: int = 4
+    embedding_max_attempts: int = 6
+    embedding_retry_base_seconds: float = 1.0
+    embedding_retry_max_seconds: float = 30.0
+
+    # In-process caches
+    profile_cache_size: int = 10_000
+    profile_cache_ttl_seconds: float = 300.0
+    embedding_cache_size: int = 5_000
+    # Optional SQLite file for a persistent query-embedding tier (unset = memory only)
+    embedding_cache_path: str | None = None
+    embedding_cache_persistent_max_entries: int = 100_000
+    response_cache_enabled: bool = True
+    response_cache_similarity_threshold: float = 0.95
+    response_cache_ttl_seconds: float = 6 * 3600
+    response_cache_max_entries_per_course: int = 500
+    response_cache_max_courses: int = 1_000
     
     class Config:
         env_file = ".env"
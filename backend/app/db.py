@@ -1,7 +1,8 @@
-from supabase import create_client, Client
+from supabase import create_client, acreate_client, Client, AsyncClient
 from app.config import get_settings
 
 _client: Client | None = None
+_async_client: AsyncClient | None = None
 
 
 def get_supabase() -> Client:
@@ -10,3 +11,12 @@ def get_supabase() -> Client:
         settings = get_settings()
         _client = create_client(settings.supabase_url, settings.supabase_service_key)
     return _client
+
+
+async def get_async_supabase() -> AsyncClient:
+    """Shared async client for request paths that must not block the event loop."""
+    global _async_client
+    if _async_client is None:
+        settings = get_settings()
+        _async_client = await acreate_client(settings.supabase_url, settings.supabase_service_key)
+    return _async_client
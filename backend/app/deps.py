@@ -1,10 +1,10 @@
 from uuid import UUID
 
-import httpx
 from fastapi import Depends, HTTPException, Header
 
-from app.config import get_settings
-from app.db import get_supabase
+from app.auth_tokens import verify_access_token
+from app.db import get_async_supabase
+from app.services.profile_cache import cache_profile, get_cached_profile
 
 
 async def get_current_user_id(
@@ -15,35 +15,20 @@ async def get_current_user_id(
     token = authorization[7:].strip()
     if not token:
         raise HTTPException(status_code=401, detail="Missing or invalid authorization")
-    settings = get_settings()
-    url = f"{settings.supabase_url.rstrip('/')}/auth/v1/user"
-    try:
-        with httpx.Client(timeout=15.0) as client:
-            r = client.get(
-                url,
-                headers={
-                    "Authorization": f"Bearer {token}",
-                    "apikey": settings.supabase_anon_key,
-                },
-            )
-    except httpx.RequestError:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-    if r.status_code != 200:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-    try:
-        uid = r.json().get("id")
-        if not uid:
-            raise ValueError("no id")
-        return UUID(uid)
-    except (ValueError, TypeError):
+    user_id = await verify_access_token(token)
+    if user_id is None:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return user_id
 
 
 async def get_current_profile(
     user_id: UUID = Depends(get_current_user_id),
 ) -> dict:
-    supabase = get_supabase()
-    row = (
+    cached = get_cached_profile(user_id)
+    if cached is not None:
+        return cached
+    supabase = await get_async_supabase()
+    row = await (
         supabase.table("users")
         .select("id, email, role, full_name, created_at")
         .eq("id", str(user_id))
@@ -51,4 +36,5 @@ async def get_current_profile(
     )
     if not row.data:
         raise HTTPException(status_code=404, detail="User profile not found")
+    cache_profile(row.data[0])
     return row.data[0]
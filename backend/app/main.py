@@ -3,6 +3,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.config import get_settings
 from app.routers import courses, upload, chat, me
 from app.routers import auth as auth_router
+from app.services.embedding_cache import embedding_cache_stats
+from app.services.pre_controller import pre_controller_stats
+from app.services.profile_cache import profile_cache_stats
+from app.services.response_cache import response_cache_stats
+from app.services.retrieval import retrieval_stats
+from app.services.vector_index import vector_index_stats
 
 settings = get_settings()
 
@@ -32,3 +38,16 @@ app.include_router(me.router, prefix="/api/me", tags=["me"])
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "tai-api"}
+
+
+@app.get("/metrics")
+async def metrics():
+    """In-process cache counters, retrieval stage latency and hint-controller paths for this worker."""
+    return {
+        "profile_cache": profile_cache_stats(),
+        "embedding_cache": embedding_cache_stats(),
+        "response_cache": response_cache_stats(),
+        "retrieval": retrieval_stats(),
+        "vector_index": vector_index_stats(),
+        "hint_controller": pre_controller_stats(),
+    }
@@ -87,6 +87,7 @@ class ChatResponse(BaseModel):
     message: ChatMessage
     hint_level: int
     action: Literal["answer", "answer_with_integrity_refusal", "refuse_out_of_scope", "redirected"]
+    cached: bool = False  # served from the course's semantic response cache
 
 
 # === Chunk/Retrieval Models ===
@@ -118,10 +119,39 @@ class RetrievalResponse(BaseModel):
 
 # === Upload Models ===
 
-class UploadResponse(BaseModel):
-    success: bool
+class UploadJobStage(BaseModel):
+    status: Literal["pending", "running", "succeeded", "failed"] = "pending"
+    completed: int = 0
+    total: int | None = None
+    attempts: int = 0
+    busy_seconds: float | None = None  # stages overlap, so these don't sum to wall time
+
+
+class EmbeddingBatch(BaseModel):
+    index: int
+    inputs: int
+    tokens: int
+    attempts: int
+    seconds: float
+
+
+class UploadJob(BaseModel):
+    id: str
+    course_id: str
+    instructor_id: str
     filename: str
-    chunks_created: int
+    status: Literal["queued", "running", "succeeded", "failed"]
+    stages: dict[str, UploadJobStage]
+    file_id: str | None = None
+    chunks_created: int | None = None
+    chunks_reused: int | None = None  # embedding already stored for identical text
+    chunks_embedded: int | None = None
+    chunks_deleted: int | None = None  # this file's chunks that are no longer in it
+    insert_rows_per_second: float | None = None
+    embedding_batches: list[EmbeddingBatch] = []
+    error: str | None = None
+    created_at: datetime
+    updated_at: datetime
 
 
 # === Hint Controller Models ===
@@ -145,3 +175,5 @@ class HintControllerOutput(BaseModel):
     notes_for_assistant: str
     student_requested_code: bool = False
     student_requested_worked_example: bool = False
+    # "rules": settled by the pre-controller without a model call
+    decided_by: Literal["rules", "llm"] = "llm"
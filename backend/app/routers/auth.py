@@ -8,6 +8,7 @@ from app.auth_utils import is_edu_email, is_valid_join_code_format, normalize_jo
 from app.config import get_settings
 from app.db import get_supabase
 from app.deps import get_current_profile
+from app.services.profile_cache import invalidate_profile
 
 router = APIRouter()
 
@@ -84,11 +85,13 @@ async def signup_instructor(data: SignupInstructorBody):
         )
         if not ins.data:
             raise RuntimeError("profile insert failed")
+        invalidate_profile(user_id)
     except HTTPException:
         raise
     except Exception as e:
         err_text = str(e)
         if user_id:
+            invalidate_profile(user_id)
             try:
                 client.auth.admin.delete_user(user_id)
             except Exception:
@@ -148,11 +151,13 @@ async def signup_student(data: SignupStudentBody):
         client.table("enrollments").insert(
             {"student_id": str(user_id), "course_id": str(course_id)}
         ).execute()
+        invalidate_profile(user_id)
     except HTTPException:
         raise
     except Exception as e:
         err_text = str(e)
         if user_id:
+            invalidate_profile(user_id)
             try:
                 client.auth.admin.delete_user(user_id)
             except Exception:
@@ -222,6 +227,9 @@ async def login(data: LoginBody):
     if not u or not u.user:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
+    # A fresh sign-in always re-reads the profile.
+    invalidate_profile(u.user.id)
+
     profile = (
         client.table("users")
         .select("role")
@@ -1,15 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Literal
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 from uuid import UUID
-from app.db import get_supabase
+from app.config import get_settings
+from app.db import get_async_supabase
 from app.deps import get_current_profile
 from app.models import (
     ChatRequest, ChatResponse, ChatMessage, Guardrails, HintState,
     HintControllerInput, HintControllerOutput, Excerpt, Source
 )
+from app.services.embeddings import embed_text
+from app.services.pre_controller import decide
+from app.services.response_cache import CachedAnswer, lookup_answer, store_answer
 from app.services.retrieval import retrieve_chunks
-from app.services.llm import run_hint_controller, run_student_assistant, build_redirect_response, extract_topic
+from app.services.llm import (
+    run_hint_controller, run_student_assistant, build_redirect_response, extract_topic,
+    stream_student_assistant, stream_redirect_response, extract_sources, run_single_shot,
+)
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 REFUSAL_MESSAGE = """I don't have enough information in the course materials to answer that question. 
@@ -22,18 +37,86 @@ Here's what you can do:
 I can only help with questions that relate to the uploaded course materials."""
 
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(
+async def store_message_topic(message_id: str, topic: str) -> None:
+    """Background task: save the topic label of a stored user message."""
+    supabase = await get_async_supabase()
+    await supabase.table("chat_messages").update({"topic": topic}).eq("id", message_id).execute()
+
+
+async def tag_message_topic(message_id: str, student_message: str, excerpts: list[Excerpt]) -> None:
+    """Background task: label a stored user message with its topic for analytics."""
+    await store_message_topic(message_id, await extract_topic(student_message, excerpts))
+
+
+class ChatTurn(BaseModel):
+    """Everything decided about a student message before the reply is generated."""
+    session_id: UUID
+    course_id: UUID
+    message: str
+    query_embedding: list[float]
+    guardrails: Guardrails
+    hint_state: HintState
+    excerpts: list[Excerpt]
+    controller_output: HintControllerOutput
+    breaches: list[str]
+    cached_answer: CachedAnswer | None = None
+    # Reply already written by the single-shot completion
+    single_shot_answer: str | None = None
+
+    @property
+    def refused(self) -> bool:
+        return self.controller_output.action == "refuse_out_of_scope"
+
+    @property
+    def hint_level(self) -> int:
+        return 0 if self.refused else self.controller_output.hint_level
+
+    @property
+    def response_action(self) -> Literal["answer", "answer_with_integrity_refusal", "refuse_out_of_scope", "redirected"]:
+        if self.refused:
+            return "refuse_out_of_scope"
+        if self.breaches:
+            return "redirected"
+        return self.controller_output.action
+
+
+async def _run_single_shot(
+    controller_input: HintControllerInput,
+    excerpts: list[Excerpt],
+) -> tuple[HintControllerOutput, str | None, str | None]:
+    """
+    Single-shot mode's controller step: (controller output, topic, answer).
+    Decisions the rules settle are enforced in code as in multi-call mode,
+    and a refused or unusable completion falls back to the LLM hint
+    controller. In both cases topic and answer are None and the student
+    assistant writes the reply.
+    """
+    settings = get_settings()
+    decision = decide(controller_input, classify=settings.hint_pre_controller)
+    if decision is not None:
+        return decision, None, None
+    try:
+        return await run_single_shot(controller_input, excerpts)
+    except ValueError:
+        logger.warning("Single-shot completion failed; using the multi-call path", exc_info=True)
+        return await run_hint_controller(controller_input, rules=False), None, None
+
+
+async def _prepare_turn(
     request: ChatRequest,
-    profile: dict = Depends(get_current_profile),
-):
-    """Process a chat message through the hint controller and student assistant."""
+    background_tasks: BackgroundTasks,
+    profile: dict,
+) -> ChatTurn:
+    """
+    Authorize the session, gather context, store the user message and run the
+    hint controller. A semantic-cache hit skips retrieval and the controller.
+    """
     if profile["role"] != "student":
         raise HTTPException(status_code=403, detail="Only students can use chat")
-    supabase = get_supabase()
+    supabase = await get_async_supabase()
 
     # Get session info
-    session = supabase.table("chat_sessions").select("*").eq(
+    session = await supabase.table("chat_sessions").select("*").eq(
         "id", str(request.session_id)
     ).execute()
 
@@ -45,32 +128,21 @@ async def chat(
         raise HTTPException(status_code=403, detail="Not your session")
     course_id = session_data["course_id"]
     
-    # Get guardrails
-    guardrails_result = supabase.table("guardrails").select("config").eq(
-        "course_id", course_id
-    ).execute()
+    # Guardrails, hint history and the query embedding only depend on the
+    # session, so fetch them concurrently.
+    guardrails_result, messages, query_embedding = await asyncio.gather(
+        supabase.table("guardrails").select("config").eq(
+            "course_id", course_id
+        ).execute(),
+        supabase.table("chat_messages").select("role, hint_level").eq(
+            "session_id", str(request.session_id)
+        ).eq("role", "assistant").execute(),
+        embed_text(request.message),
+    )
     
     guardrails = Guardrails(**(guardrails_result.data[0]["config"] if guardrails_result.data else {}))
     
-    # Retrieve relevant chunks
-    excerpts = retrieve_chunks(UUID(course_id), request.message)
-    
-    # Extract topic from student message (lightweight LLM call)
-    topic = extract_topic(request.message, excerpts)
-    
-    # Store user message with topic
-    user_msg_result = supabase.table("chat_messages").insert({
-        "session_id": str(request.session_id),
-        "role": "user",
-        "content": request.message,
-        "topic": topic
-    }).execute()
-    
     # Calculate hint state from session history
-    messages = supabase.table("chat_messages").select("role, hint_level").eq(
-        "session_id", str(request.session_id)
-    ).eq("role", "assistant").execute()
-    
     assistant_messages = messages.data or []
     hint_levels_used = [m["hint_level"] for m in assistant_messages if m["hint_level"] is not None]
     
@@ -83,41 +155,57 @@ async def chat(
     if request.request_hint_increase and hint_state.number_of_hints_given > 0:
         hint_state.number_of_hints_given += 1
     
-    # Run hint controller
+    # Store user message while the rest of the turn runs. The topic label is
+    # filled in by a background task once the reply has been sent.
+    store_user_message = asyncio.ensure_future(supabase.table("chat_messages").insert({
+        "session_id": str(request.session_id),
+        "role": "user",
+        "content": request.message,
+    }).execute())
+
+    # The cache is keyed on the controller's inputs, so a hit replays the
+    # stored decision without retrieval or any model call.
+    cached_answer = lookup_answer(UUID(course_id), query_embedding, request.message, guardrails, hint_state)
+    if cached_answer is not None:
+        user_msg_result = await store_user_message
+        if user_msg_result.data:
+            background_tasks.add_task(tag_message_topic, user_msg_result.data[0]["id"], request.message, [])
+        return ChatTurn(
+            session_id=request.session_id,
+            course_id=UUID(course_id),
+            message=request.message,
+            query_embedding=query_embedding,
+            guardrails=guardrails,
+            hint_state=hint_state,
+            excerpts=[],
+            controller_output=cached_answer.controller_output,
+            breaches=cached_answer.breaches,
+            cached_answer=cached_answer,
+        )
+
+    excerpts = await retrieve_chunks(UUID(course_id), request.message, query_embedding=query_embedding)
     controller_input = HintControllerInput(
         student_message=request.message,
         guardrails=guardrails,
         hint_state=hint_state,
         excerpt_hit_count=len(excerpts)
     )
-    
-    controller_output = run_hint_controller(controller_input)
-    
-    # Handle refusal case
-    if controller_output.action == "refuse_out_of_scope":
-        # Store refusal message with action and empty sources
-        assistant_msg = supabase.table("chat_messages").insert({
-            "session_id": str(request.session_id),
-            "role": "assistant",
-            "content": REFUSAL_MESSAGE,
-            "hint_level": 0,
-            "action": "refuse_out_of_scope",
-            "sources": []
-        }).execute()
-        
-        return ChatResponse(
-            message=ChatMessage(
-                id=assistant_msg.data[0]["id"],
-                session_id=request.session_id,
-                role="assistant",
-                content=REFUSAL_MESSAGE,
-                hint_level=0,
-                created_at=assistant_msg.data[0]["created_at"],
-                sources=[]
-            ),
-            hint_level=0,
-            action="refuse_out_of_scope"
+    single_shot_answer = topic = None
+    if get_settings().chat_mode == "single_shot":
+        user_msg_result, (controller_output, topic, single_shot_answer) = await asyncio.gather(
+            store_user_message, _run_single_shot(controller_input, excerpts),
         )
+    else:
+        user_msg_result, controller_output = await asyncio.gather(
+            store_user_message, run_hint_controller(controller_input),
+        )
+    if user_msg_result.data:
+        if topic is not None:
+            background_tasks.add_task(store_message_topic, user_msg_result.data[0]["id"], topic)
+        else:
+            background_tasks.add_task(
+                tag_message_topic, user_msg_result.data[0]["id"], request.message, excerpts
+            )
     
     # Detect guardrail breaches
     breaches: list[str] = []
@@ -128,50 +216,190 @@ async def chat(
     if controller_output.student_requested_worked_example and not guardrails.allow_worked_examples:
         breaches.append("worked_example_not_allowed")
 
-    if breaches:
-        # Redirect: deterministic acknowledgment + Socratic follow-up
-        response_content, sources = build_redirect_response(
-            breaches=breaches,
-            guardrails=guardrails,
-            student_message=request.message,
-            excerpts=excerpts,
-            clamped_hint_level=controller_output.hint_level,
-            raw_hint_level=controller_output.raw_hint_level,
-        )
-        response_action = "redirected"
-    else:
-        # Normal path: run student assistant
-        response_content, sources = run_student_assistant(
-            student_message=request.message,
-            excerpts=excerpts,
-            guardrails=guardrails,
-            hint_level=controller_output.hint_level,
-            controller_notes=controller_output.notes_for_assistant,
-            action=controller_output.action,
-        )
-        response_action = controller_output.action
+    return ChatTurn(
+        session_id=request.session_id,
+        course_id=UUID(course_id),
+        message=request.message,
+        query_embedding=query_embedding,
+        guardrails=guardrails,
+        hint_state=hint_state,
+        excerpts=excerpts,
+        controller_output=controller_output,
+        breaches=breaches,
+        single_shot_answer=single_shot_answer,
+    )
+
+
+def _remember_answer(turn: ChatTurn, content: str, sources: list[Source]) -> None:
+    """Offer a freshly generated answer to the course's semantic response cache."""
+    if turn.refused or turn.cached_answer is not None:
+        return
+    store_answer(
+        turn.course_id, turn.query_embedding, turn.message, turn.guardrails, turn.hint_state,
+        turn.controller_output, turn.breaches, content, sources,
+    )
 
-    # Store assistant message with sources and action
+
+async def _store_assistant_message(turn: ChatTurn, content: str, sources: list[Source]) -> ChatResponse:
+    """Persist the assistant reply with its sources and action, and build the API response."""
+    supabase = await get_async_supabase()
     sources_json = [s.model_dump() for s in sources]
-    assistant_msg = supabase.table("chat_messages").insert({
-        "session_id": str(request.session_id),
+    assistant_msg = await supabase.table("chat_messages").insert({
+        "session_id": str(turn.session_id),
         "role": "assistant",
-        "content": response_content,
-        "hint_level": controller_output.hint_level,
-        "action": response_action,
+        "content": content,
+        "hint_level": turn.hint_level,
+        "action": turn.response_action,
         "sources": sources_json
     }).execute()
     
     return ChatResponse(
         message=ChatMessage(
             id=assistant_msg.data[0]["id"],
-            session_id=request.session_id,
+            session_id=turn.session_id,
             role="assistant",
-            content=response_content,
-            hint_level=controller_output.hint_level,
+            content=content,
+            hint_level=turn.hint_level,
             created_at=assistant_msg.data[0]["created_at"],
             sources=sources
         ),
-        hint_level=controller_output.hint_level,
-        action=response_action
+        hint_level=turn.hint_level,
+        action=turn.response_action,
+        cached=turn.cached_answer is not None,
+    )
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(
+    request: ChatRequest,
+    background_tasks: BackgroundTasks,
+    profile: dict = Depends(get_current_profile),
+):
+    """Process a chat message through the hint controller and student assistant."""
+    turn = await _prepare_turn(request, background_tasks, profile)
+    controller_output = turn.controller_output
+
+    if turn.refused:
+        response_content, sources = REFUSAL_MESSAGE, []
+    elif turn.cached_answer is not None:
+        response_content, sources = turn.cached_answer.content, turn.cached_answer.sources
+    elif turn.breaches:
+        # Redirect: deterministic acknowledgment + Socratic follow-up
+        response_content, sources = await build_redirect_response(
+            breaches=turn.breaches,
+            guardrails=turn.guardrails,
+            student_message=turn.message,
+            excerpts=turn.excerpts,
+            clamped_hint_level=controller_output.hint_level,
+            raw_hint_level=controller_output.raw_hint_level,
+        )
+    elif turn.single_shot_answer is not None:
+        response_content, sources = turn.single_shot_answer, extract_sources(turn.excerpts)
+    else:
+        # Normal path: run student assistant
+        response_content, sources = await run_student_assistant(
+            student_message=turn.message,
+            excerpts=turn.excerpts,
+            guardrails=turn.guardrails,
+            hint_level=controller_output.hint_level,
+            controller_notes=controller_output.notes_for_assistant,
+            action=controller_output.action,
+        )
+    _remember_answer(turn, response_content, sources)
+
+    return await _store_assistant_message(turn, response_content, sources)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _fixed_stream(content: str) -> AsyncIterator[str]:
+    yield content
+
+
+# Keeps partial-reply writes alive after a client disconnects mid-stream.
+_pending_writes: set[asyncio.Task] = set()
+
+
+@router.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    background_tasks: BackgroundTasks,
+    profile: dict = Depends(get_current_profile),
+):
+    """
+    Streaming variant of /chat using Server-Sent Events.
+
+    Events, in order:
+    - ``meta``: ``{"sources", "action", "hint_level", "cached"}``, sent before generation starts
+    - ``token``: ``{"delta"}``, one per chunk of generated text
+    - ``done``: the same payload POST /chat returns, once the reply is stored
+    """
+    turn = await _prepare_turn(request, background_tasks, profile)
+    controller_output = turn.controller_output
+
+    if turn.refused:
+        sources: list[Source] = []
+        deltas = _fixed_stream(REFUSAL_MESSAGE)
+    elif turn.cached_answer is not None:
+        sources = turn.cached_answer.sources
+        deltas = _fixed_stream(turn.cached_answer.content)
+    elif turn.breaches:
+        sources = extract_sources(turn.excerpts)
+        deltas = stream_redirect_response(
+            breaches=turn.breaches,
+            guardrails=turn.guardrails,
+            student_message=turn.message,
+            excerpts=turn.excerpts,
+            clamped_hint_level=controller_output.hint_level,
+            raw_hint_level=controller_output.raw_hint_level,
+        )
+    elif turn.single_shot_answer is not None:
+        # Generated as part of a structured reply, so it arrives in one piece
+        sources = extract_sources(turn.excerpts)
+        deltas = _fixed_stream(turn.single_shot_answer)
+    else:
+        sources = extract_sources(turn.excerpts)
+        deltas = stream_student_assistant(
+            student_message=turn.message,
+            excerpts=turn.excerpts,
+            guardrails=turn.guardrails,
+            hint_level=controller_output.hint_level,
+            controller_notes=controller_output.notes_for_assistant,
+            action=controller_output.action,
+        )
+
+    async def event_stream() -> AsyncIterator[str]:
+        parts: list[str] = []
+        completed = False
+        try:
+            yield _sse("meta", {
+                "sources": [s.model_dump() for s in sources],
+                "action": turn.response_action,
+                "hint_level": turn.hint_level,
+                "cached": turn.cached_answer is not None,
+            })
+            async for delta in deltas:
+                parts.append(delta)
+                yield _sse("token", {"delta": delta})
+            completed = True
+        except Exception:
+            yield _sse("error", {"detail": "Failed to generate a response"})
+            return
+        finally:
+            if not completed and parts:
+                # Client went away: keep what was generated so the history stays consistent.
+                task = asyncio.ensure_future(_store_assistant_message(turn, "".join(parts), sources))
+                _pending_writes.add(task)
+                task.add_done_callback(_pending_writes.discard)
+
+        _remember_answer(turn, "".join(parts), sources)
+        response = await _store_assistant_message(turn, "".join(parts), sources)
+        yield _sse("done", response.model_dump(mode="json"))
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
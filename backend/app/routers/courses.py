@@ -16,6 +16,8 @@ from app.models import (
     SessionCreate,
     ChatMessage,
 )
+from app.services.response_cache import invalidate_course
+from app.services.vector_index import rebuild_course_index
 
 router = APIRouter()
 
@@ -171,6 +173,7 @@ async def update_guardrails(
     supabase.table("guardrails").upsert(
         {"course_id": str(course_id), "config": updated}
     ).execute()
+    invalidate_course(course_id)
 
     return Guardrails(**updated)
 
@@ -283,11 +286,16 @@ async def delete_course_file(
     
     file_data = file_result.data[0]
     
-    # Delete chunks first (cascade should handle this, but be explicit)
-    supabase.table("chunks").delete().eq("file_id", str(file_id)).execute()
+    # Delete chunks first (cascade should handle this, but be explicit).
+    # Filtering on course_id limits the delete to the course's partition.
+    supabase.table("chunks").delete().eq("course_id", str(course_id)).eq(
+        "file_id", str(file_id)
+    ).execute()
     
     # Delete file record
     supabase.table("course_files").delete().eq("id", str(file_id)).execute()
+    invalidate_course(course_id)
+    rebuild_course_index(course_id)
     
     # Delete from storage
     try:
@@ -1,104 +1,205 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from uuid import UUID
-import io
+import os
+import tempfile
+from fastapi import APIRouter, Depends, HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+from app.config import get_settings
 from app.db import get_supabase
 from app.deps import get_current_profile
-from app.models import UploadResponse
-from app.services.chunking import extract_text, chunk_text
-from app.services.embeddings import embed_texts
+from app.models import UploadJob
+from app.services.ingestion import get_job, submit_upload
 
 router = APIRouter()
 
+# Room in the request body for multipart boundaries, part headers and the course_id field
+FORM_OVERHEAD_BYTES = 64 * 1024
 
-@router.post("/upload", response_model=UploadResponse)
+
+# Documents the form the handler parses itself
+UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "required": ["file", "course_id"],
+        "properties": {"file": {"type": "string", "format": "binary"}, "course_id": {"type": "string"}},
+    }}},
+}
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File too large. Maximum size is {max_bytes // (1024 * 1024)} MB.",
+    )
+
+
+class _UploadForm:
+    """
+    Multipart parser callbacks for the upload form. The file part is written
+    to a temp file as it arrives; other parts are kept as text fields.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.fields: dict[str, str] = {}
+        self.filename: str | None = None
+        self.content_type = "application/octet-stream"
+        self.path: str | None = None
+        self._file = None
+        self._file_bytes = 0
+        self._headers: dict[bytes, bytes] = {}
+        self._header_field: list[bytes] = []
+        self._header_value: list[bytes] = []
+        self._field_name: str | None = None
+        self._field_value: list[bytes] = []
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field.append(data[start:end])
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value.append(data[start:end])
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+        self._field_name = None
+        self._field_value = []
+
+    def on_header_end(self) -> None:
+        self._headers[b"".join(self._header_field).lower()] = b"".join(self._header_value)
+        self._header_field.clear()
+        self._header_value.clear()
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" not in options:
+            self._field_name = name
+            return
+        if name != "file" or self._file is not None:
+            raise HTTPException(status_code=400, detail="Send exactly one file in the 'file' field.")
+        self.filename = options[b"filename"].decode("utf-8", "replace") or "unnamed_file"
+        # Reject unsupported types before any of the file is written
+        if not self.filename.lower().endswith((".pdf", ".txt", ".md")):
+            raise HTTPException(status_code=400, detail="Unsupported file type. Use PDF, TXT, or MD.")
+        if b"content-type" in self._headers:
+            self.content_type = self._headers[b"content-type"].decode("latin-1")
+        self._file = tempfile.NamedTemporaryFile(suffix=os.path.splitext(self.filename)[1], delete=False)
+        self.path = self._file.name
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._file is None:
+            self._field_value.append(data[start:end])
+            return
+        self._file_bytes += end - start
+        if self._file_bytes > self.max_bytes:
+            raise _too_large(self.max_bytes)
+        self._file.write(data[start:end])
+
+    def on_part_end(self) -> None:
+        if self._field_name is not None:
+            self.fields[self._field_name] = b"".join(self._field_value).decode("utf-8", "replace")
+        elif self._file is not None and not self._file.closed:
+            self._file.close()
+
+    @property
+    def complete(self) -> bool:
+        """A file part was received in full and a course_id field was sent."""
+        return self._file is not None and self._file.closed and "course_id" in self.fields
+
+    def discard(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        if self.path is not None:
+            os.unlink(self.path)
+
+
+async def _receive_upload(request: Request, max_bytes: int) -> _UploadForm:
+    """
+    Stream the multipart body into an _UploadForm, rejecting it as soon as
+    the file passes max_bytes. Nothing is buffered ahead of this: a declared
+    Content-Length over the limit is refused before the body is read.
+    """
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_bytes + FORM_OVERHEAD_BYTES:
+        raise _too_large(max_bytes)
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload.")
+
+    form = _UploadForm(max_bytes)
+    parser = MultipartParser(options[b"boundary"], {
+        "on_part_begin": form.on_part_begin,
+        "on_header_field": form.on_header_field,
+        "on_header_value": form.on_header_value,
+        "on_header_end": form.on_header_end,
+        "on_headers_finished": form.on_headers_finished,
+        "on_part_data": form.on_part_data,
+        "on_part_end": form.on_part_end,
+    })
+    received = 0
+    try:
+        async for chunk in request.stream():
+            # Bounds what a client can send even without a (truthful) Content-Length
+            received += len(chunk)
+            if received > max_bytes + FORM_OVERHEAD_BYTES:
+                raise _too_large(max_bytes)
+            parser.write(chunk)
+        parser.finalize()
+    except BaseException:
+        form.discard()
+        raise
+    if not form.complete:
+        form.discard()
+        raise HTTPException(status_code=422, detail="Both 'file' and 'course_id' are required.")
+    return form
+
+
+@router.post(
+    "/upload", response_model=UploadJob, status_code=202,
+    openapi_extra={"requestBody": UPLOAD_REQUEST_BODY},
+)
 async def upload_file(
-    file: UploadFile = File(...),
-    course_id: str = Form(...),
+    request: Request,
     profile: dict = Depends(get_current_profile),
 ):
-    """Upload a file, extract text, chunk it, embed chunks, and store in database."""
+    """
+    Accept a multipart upload (``file``, ``course_id``) and queue it for
+    ingestion (storage upload, text extraction, chunking, embedding, chunk
+    insert). Poll GET /upload/jobs/{job_id} for progress.
+    """
     if profile["role"] != "instructor":
         raise HTTPException(status_code=403, detail="Only instructors can upload files")
-    supabase = get_supabase()
-
-    course = supabase.table("courses").select("id, instructor_id").eq("id", course_id).execute()
-    if not course.data:
-        raise HTTPException(status_code=404, detail="Course not found")
-    if str(course.data[0]["instructor_id"]) != str(profile["id"]):
-        raise HTTPException(status_code=403, detail="Only the course instructor can upload")
-    
-    # Read file content
-    content = await file.read()
-    filename = file.filename or "unnamed_file"
-    
-    # Determine file type and extract text
-    if filename.lower().endswith(".pdf"):
-        text = extract_text(io.BytesIO(content), "pdf")
-    elif filename.lower().endswith((".txt", ".md")):
-        text = content.decode("utf-8")
-    else:
-        raise HTTPException(status_code=400, detail="Unsupported file type. Use PDF, TXT, or MD.")
-    
-    if not text.strip():
-        raise HTTPException(status_code=400, detail="No text content found in file")
-    
-    # Upload original file to storage
-    storage_path = f"{course_id}/{filename}"
+
+    # Spool to disk while receiving; the ingestion job owns (and deletes) the temp file
+    form = await _receive_upload(request, get_settings().max_upload_bytes)
+    assert form.path is not None and form.filename is not None
+    course_id = form.fields["course_id"]
     try:
-        supabase.storage.from_("course-files").upload(
-            storage_path,
-            content,
-            file_options={"content-type": file.content_type or "application/octet-stream"}
-        )
-    except Exception:
-        # File might already exist, try to update
-        try:
-            supabase.storage.from_("course-files").update(
-                storage_path,
-                content,
-                file_options={"content-type": file.content_type or "application/octet-stream"}
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to upload file to storage: {e}")
-    
-    # Create file record
-    file_result = supabase.table("course_files").insert({
-        "course_id": course_id,
-        "filename": filename,
-        "storage_path": storage_path
-    }).execute()
-    
-    if not file_result.data:
-        raise HTTPException(status_code=500, detail="Failed to create file record")
-    
-    file_id = file_result.data[0]["id"]
-    
-    # Chunk the text
-    chunks = chunk_text(text)
-    
-    if not chunks:
-        raise HTTPException(status_code=400, detail="No chunks generated from file")
-    
-    # Generate embeddings for all chunks
-    embeddings = embed_texts(chunks)
-    
-    # Prepare chunk records
-    chunk_records = [
-        {
-            "course_id": course_id,
-            "file_id": file_id,
-            "chunk_index": i,
-            "content": chunk,
-            "embedding": embedding
-        }
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings))
-    ]
-    
-    # Batch insert chunks
-    supabase.table("chunks").insert(chunk_records).execute()
-    
-    return UploadResponse(
-        success=True,
-        filename=filename,
-        chunks_created=len(chunks)
+        supabase = get_supabase()
+        course = supabase.table("courses").select("id, instructor_id").eq("id", course_id).execute()
+        if not course.data:
+            raise HTTPException(status_code=404, detail="Course not found")
+        if str(course.data[0]["instructor_id"]) != str(profile["id"]):
+            raise HTTPException(status_code=403, detail="Only the course instructor can upload")
+    except BaseException:
+        form.discard()
+        raise
+
+    return submit_upload(
+        course_id=course_id,
+        instructor_id=str(profile["id"]),
+        filename=form.filename,
+        path=form.path,
+        content_type=form.content_type,
     )
+
+
+@router.get("/upload/jobs/{job_id}", response_model=UploadJob)
+async def get_upload_job(
+    job_id: str,
+    profile: dict = Depends(get_current_profile),
+):
+    """Report the status and per-stage progress of an ingestion job."""
+    job = get_job(job_id)
+    if job is None or job.instructor_id != str(profile["id"]):
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return job
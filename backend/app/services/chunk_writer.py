@@ -0,0 +1,153 @@
+"""
+Bulk writes of chunk rows.
+
+Rows go to PostgREST in batches bounded by payload size, with embeddings
+serialized as compact pgvector text ("[0.0123,-0.04567,...]") instead of
+JSON float arrays. When ``database_url`` is set, rows are streamed into
+Postgres with ``COPY`` instead (needs the optional ``psycopg`` package),
+over one connection per ingestion job (see ``copy_connection``).
+"""
+import json
+import time
+from contextlib import AbstractContextManager, nullcontext
+from functools import lru_cache
+from typing import Any
+
+from postgrest.types import ReturnMethod
+from pydantic import BaseModel
+
+from app.config import get_settings
+from app.db import get_supabase
+
+try:
+    import psycopg  # pyright: ignore[reportMissingImports]
+except ImportError:  # optional: only needed for the COPY path
+    psycopg = None
+
+# Rows carry their id, generated by the caller, so a failed ingestion can delete what it wrote
+COPY_COLUMNS = (
+    "id", "course_id", "file_id", "chunk_index", "content", "content_hash",
+    "embedding_model", "page", "char_start", "char_end", "embedding",
+)
+
+
+class WriteStats(BaseModel):
+    rows: int = 0
+    batches: int = 0
+    payload_bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def add(self, other: "WriteStats") -> None:
+        self.rows += other.rows
+        self.batches += other.batches
+        self.payload_bytes += other.payload_bytes
+        self.seconds += other.seconds
+
+
+@lru_cache(maxsize=8)
+def _vector_format(dimensions: int) -> str:
+    return "[" + ",".join(["%.7g"] * dimensions) + "]"
+
+
+def format_vector(values: list[float]) -> str:
+    """pgvector text form with float32 precision (what the column stores), about half the size of JSON."""
+    # One %-format over the whole vector is ~40% faster than formatting each float
+    return _vector_format(len(values)) % tuple(values)
+
+
+def _serialize(record: dict) -> dict:
+    embedding = record.get("embedding")
+    if embedding is None or isinstance(embedding, str):
+        return record
+    return {**record, "embedding": format_vector(embedding)}
+
+
+def size_bounded_batches(rows: list[dict], max_bytes: int, max_rows: int) -> list[tuple[list[dict], int]]:
+    """Split serialized rows into (batch, payload bytes) pairs under both limits; an oversized row goes alone."""
+    batches = []
+    batch: list[dict] = []
+    size = 2  # "[]"
+    for row in rows:
+        row_size = len(json.dumps(row, separators=(",", ":"))) + 1
+        if batch and (size + row_size > max_bytes or len(batch) >= max_rows):
+            batches.append((batch, size))
+            batch, size = [], 2
+        batch.append(row)
+        size += row_size
+    if batch:
+        batches.append((batch, size))
+    return batches
+
+
+def copy_connection(database_url: str | None = None) -> AbstractContextManager[Any]:
+    """
+    A direct Postgres connection to pass to insert_chunks / copy_chunks for a
+    run of batches, so each batch is only a COPY rather than a connect, auth
+    handshake and COPY. Yields None when no ``database_url`` is configured.
+    """
+    url = database_url or get_settings().database_url
+    if not url:
+        return nullcontext()
+    if psycopg is None:
+        raise RuntimeError("database_url is set but psycopg is not installed (pip install 'psycopg[binary]')")
+    return psycopg.connect(url)
+
+
+def insert_chunks(records: list[dict], conn: Any = None) -> WriteStats:
+    """
+    Insert new chunk rows, each with an ``id``, by COPY if ``database_url``
+    is configured, else through PostgREST. ``conn`` is a connection from
+    copy_connection; without one the COPY path connects for this call.
+    """
+    if not records:
+        return WriteStats()
+    if get_settings().database_url:
+        return copy_chunks(records, conn=conn)
+    return _insert_via_postgrest(records)
+
+
+def _insert_via_postgrest(records: list[dict]) -> WriteStats:
+    settings = get_settings()
+    supabase = get_supabase()
+    stats = WriteStats()
+    started = time.perf_counter()
+    rows = [_serialize(r) for r in records]
+    for batch, size in size_bounded_batches(
+        rows, settings.chunk_insert_max_bytes, settings.chunk_insert_max_rows
+    ):
+        # Minimal return: echoing the rows back would double the transfer
+        supabase.table("chunks").insert(batch, returning=ReturnMethod.minimal).execute()
+        stats.rows += len(batch)
+        stats.batches += 1
+        stats.payload_bytes += size
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def copy_chunks(records: list[dict], database_url: str | None = None, conn: Any = None) -> WriteStats:
+    """
+    Stream rows into the chunks table with COPY over a direct Postgres
+    connection, committed as one transaction. Reuses ``conn`` if given.
+    """
+    if conn is None:
+        with copy_connection(database_url) as conn:
+            if conn is None:
+                raise RuntimeError("COPY needs a database_url")
+            return copy_chunks(records, conn=conn)
+    stats = WriteStats(batches=1)
+    started = time.perf_counter()
+    columns = ", ".join(COPY_COLUMNS)
+    with conn.transaction():
+        with conn.cursor() as cur:
+            with cur.copy(f"COPY chunks ({columns}) FROM STDIN") as copy:
+                for record in records:
+                    row = _serialize(record)
+                    copy.write_row([row.get(column) for column in COPY_COLUMNS])
+                    stats.rows += 1
+                    stats.payload_bytes += len(row["content"]) + len(row["embedding"])
+    stats.seconds = time.perf_counter() - started
+    return stats
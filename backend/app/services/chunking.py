@@ -1,7 +1,19 @@
 import io
-from typing import BinaryIO
+import math
+import multiprocessing
+import re
+import shutil
+import tempfile
+import threading
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import chain
+from typing import BinaryIO, Iterable, Iterator, cast
+import numpy as np
 import tiktoken
 import pdfplumber
+from pydantic import BaseModel
 from app.config import get_settings
 
 
@@ -14,27 +26,150 @@ def extract_text(file: BinaryIO, file_type: str) -> str:
         return file.read().decode("utf-8")
 
 
-def extract_pdf_text(file: BinaryIO) -> str:
-    """Extract text from a PDF file using pdfplumber."""
-    text_parts = []
-    
+def extract_pdf_text(file: BinaryIO | str) -> str:
+    """Extract text from a PDF file (stream or path) using pdfplumber."""
+    return "\n\n".join(page for page in extract_pdf_pages(file) if page)
+
+
+def extract_pdf_pages(file: BinaryIO | str, workers: int | None = None) -> list[str]:
+    """
+    Extract the text of every page, in page order.
+
+    Large PDFs are sharded into page ranges and parsed in a process pool,
+    since pdfplumber is CPU-bound pure Python. Small ones are parsed inline.
+    """
+    settings = get_settings()
+    workers = settings.pdf_extract_workers if workers is None else workers
+
+    if isinstance(file, str):
+        return _extract_pdf_pages_from_path(file, workers)
+
+    if workers <= 1:
+        return _extract_page_range(file, 0, None)
+    # Worker processes need something they can open themselves
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp:
+        shutil.copyfileobj(file, tmp)
+        tmp.flush()
+        return _extract_pdf_pages_from_path(tmp.name, workers)
+
+
+def _extract_pdf_pages_from_path(path: str, workers: int) -> list[str]:
+    return list(iter_pdf_pages(path, workers))
+
+
+def iter_pdf_pages(path: str, workers: int | None = None) -> Iterator[str]:
+    """Like extract_pdf_pages, but yields each page's text (in order) as soon as it is parsed."""
+    settings = get_settings()
+    workers = settings.pdf_extract_workers if workers is None else workers
+    with pdfplumber.open(path) as pdf:
+        page_count = len(pdf.pages)
+        if workers <= 1 or page_count < settings.pdf_parallel_min_pages:
+            for page in pdf.pages:
+                yield page.extract_text() or ""
+                page.close()
+            return
+
+    # A few shards per worker keeps the pool busy when some pages are much heavier
+    shard_size = max(1, math.ceil(page_count / (workers * 4)))
+    starts = list(range(0, page_count, shard_size))
+    stops = [min(start + shard_size, page_count) for start in starts]
+    pool = _get_process_pool(workers)
+    for shard in pool.map(_extract_page_range, [path] * len(starts), starts, stops):
+        yield from shard
+
+
+def _extract_page_range(file: BinaryIO | str, start: int, stop: int | None) -> list[str]:
+    texts = []
     with pdfplumber.open(file) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text_parts.append(page_text)
-    
-    return "\n\n".join(text_parts)
+        for page in pdf.pages[start:stop]:
+            texts.append(page.extract_text() or "")
+            # Drop the page's parsed layout objects so memory doesn't grow with page count
+            page.close()
+    return texts
 
 
-def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
-    """Count the number of tokens in a text string."""
+_process_pool: ProcessPoolExecutor | None = None
+_process_pool_workers = 0
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    global _process_pool, _process_pool_workers
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool_workers != workers:
+            if _process_pool is not None:
+                _process_pool.shutdown(wait=False)
+            # spawn, not fork: the API process is multi-threaded
+            _process_pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            _process_pool_workers = workers
+    return _process_pool
+
+
+@lru_cache(maxsize=8)
+def get_encoding(model: str = "gpt-4o-mini") -> tiktoken.Encoding:
+    """Tokenizer for a model, built once per process."""
     try:
-        encoding = tiktoken.encoding_for_model(model)
+        return tiktoken.encoding_for_model(model)
     except KeyError:
-        encoding = tiktoken.get_encoding("cl100k_base")
-    
-    return len(encoding.encode(text))
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Count the number of tokens in a text string."""
+    return len(get_encoding(model).encode_ordinary(text))
+
+
+@lru_cache(maxsize=8)
+def _token_byte_lengths(encoding: tiktoken.Encoding) -> np.ndarray:
+    lengths = np.zeros(encoding.n_vocab, dtype=np.int64)
+    for token in range(encoding.n_vocab):
+        try:
+            lengths[token] = len(encoding.decode_single_token_bytes(token))
+        except KeyError:
+            pass
+    return lengths
+
+
+class _TokenOffsets:
+    """One encoding of a whole document, for counting the tokens of any character span without re-encoding it."""
+
+    def __init__(self, text: str, model: str = "gpt-4o-mini"):
+        encoding = get_encoding(model)
+        tokens = np.asarray(encoding.encode_ordinary(text), dtype=np.int64)
+        # Token boundaries are byte offsets (one can fall inside a multi-byte character)
+        token_bytes = np.cumsum(_token_byte_lengths(encoding)[tokens]) - _token_byte_lengths(encoding)[tokens]
+        codepoints = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        char_bytes = 1 + (codepoints >= 0x80) + (codepoints >= 0x800) + (codepoints >= 0x10000)
+        char_ends = np.cumsum(char_bytes)
+        starts = np.searchsorted(char_ends, token_bytes, side="right")
+        self.starts = cast(list[int], starts.tolist())  # 1-D, so a flat list
+
+    def count(self, start: int, end: int) -> int:
+        """Tokens overlapping text[start:end], including one that starts before it (e.g. " Word")."""
+        first = max(bisect_right(self.starts, start) - 1, 0)
+        return bisect_left(self.starts, end) - first
+
+
+def _split_spans(text: str, start: int, end: int, separator: re.Pattern) -> list[tuple[int, int]]:
+    """(start, end) of the stripped, non-empty pieces of text[start:end] between separator matches."""
+    spans = []
+    pos = start
+    for match in chain(separator.finditer(text, start, end), [None]):
+        stop = match.start() if match else end
+        piece = text[pos:stop]
+        stripped = piece.strip()
+        if stripped:
+            lead = len(piece) - len(piece.lstrip())
+            spans.append((pos + lead, pos + lead + len(stripped)))
+        if match:
+            pos = match.end()
+    return spans
+
+
+_PARAGRAPH_BREAK = re.compile(r"\n\n")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
 
 
 def chunk_text(text: str) -> list[str]:
@@ -45,56 +180,55 @@ def chunk_text(text: str) -> list[str]:
     1. Split by paragraphs (double newlines)
     2. If a paragraph is too large, split by sentences
     3. Merge small paragraphs to reach target size
+
+    The document is tokenized once; paragraph and sentence sizes are read
+    off the token offsets rather than re-encoding each piece.
     """
     settings = get_settings()
     target_size = settings.chunk_size
-    overlap = settings.chunk_overlap
     
     # Clean and normalize text
     text = text.strip()
     text = "\n".join(line.strip() for line in text.split("\n"))
-    
-    # Split into paragraphs
-    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
+    tokens = _TokenOffsets(text)
     
     chunks = []
-    current_chunk = []
-    current_tokens = 0
+    current_chunk: list[str] = []
+    current_counts: list[int] = []
     
-    for para in paragraphs:
-        para_tokens = count_tokens(para)
+    for p_start, p_end in _split_spans(text, 0, len(text), _PARAGRAPH_BREAK):
+        para_tokens = tokens.count(p_start, p_end)
         
         # If single paragraph exceeds target, split it further
         if para_tokens > target_size * 1.5:
             # Flush current chunk first
             if current_chunk:
                 chunks.append("\n\n".join(current_chunk))
-                current_chunk = []
-                current_tokens = 0
+                current_chunk, current_counts = [], []
             
             # Split large paragraph by sentences
-            sentences = split_into_sentences(para)
-            for sentence in sentences:
-                sent_tokens = count_tokens(sentence)
+            for s_start, s_end in _split_spans(text, p_start, p_end, _SENTENCE_BREAK):
+                sent_tokens = tokens.count(s_start, s_end)
                 
-                if current_tokens + sent_tokens > target_size and current_chunk:
+                if sum(current_counts) + sent_tokens > target_size and current_chunk:
                     chunks.append(" ".join(current_chunk))
                     # Keep some overlap
-                    overlap_text = " ".join(current_chunk[-2:]) if len(current_chunk) >= 2 else ""
-                    current_chunk = [overlap_text] if overlap_text else []
-                    current_tokens = count_tokens(overlap_text) if overlap_text else 0
+                    if len(current_chunk) >= 2:
+                        current_chunk = [" ".join(current_chunk[-2:])]
+                        current_counts = [sum(current_counts[-2:])]
+                    else:
+                        current_chunk, current_counts = [], []
                 
-                current_chunk.append(sentence)
-                current_tokens += sent_tokens
+                current_chunk.append(text[s_start:s_end])
+                current_counts.append(sent_tokens)
         else:
             # Check if adding this paragraph exceeds target
-            if current_tokens + para_tokens > target_size and current_chunk:
+            if sum(current_counts) + para_tokens > target_size and current_chunk:
                 chunks.append("\n\n".join(current_chunk))
-                current_chunk = []
-                current_tokens = 0
+                current_chunk, current_counts = [], []
             
-            current_chunk.append(para)
-            current_tokens += para_tokens
+            current_chunk.append(text[p_start:p_end])
+            current_counts.append(para_tokens)
     
     # Don't forget the last chunk
     if current_chunk:
@@ -108,8 +242,194 @@ def chunk_text(text: str) -> list[str]:
 
 def split_into_sentences(text: str) -> list[str]:
     """Simple sentence splitter."""
-    import re
-    
-    # Split on sentence-ending punctuation followed by space
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    return [s.strip() for s in sentences if s.strip()]
+    return [text[start:end] for start, end in _split_spans(text, 0, len(text), _SENTENCE_BREAK)]
+
+
+class ChunkSpan(BaseModel):
+    """A chunk plus where it came from. Offsets index the extracted document text."""
+    content: str
+    page: int | None = None  # 1-based; None for plain-text files
+    char_start: int | None = None
+    char_end: int | None = None
+
+
+def chunk_document(text: str, page_starts: list[int] | None = None) -> list[ChunkSpan]:
+    """
+    Chunk an extracted document using the configured ``chunking_mode``.
+    ``page_starts[i]`` is the offset in ``text`` where page i + 1 begins.
+    """
+    if get_settings().chunking_mode == "structured":
+        return chunk_structured(text, page_starts)
+    # Paragraph mode normalizes whitespace, so its chunks have no offsets into text
+    return [ChunkSpan(content=chunk) for chunk in chunk_text(text)]
+
+
+# How good a place each kind of boundary is to end a chunk, best last
+_LINE, _UNIT, _BLOCK, _HEADING = 1, 2, 3, 4
+
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_HEADING_LINE = re.compile(r"^#{1,6}\s")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s")
+
+
+def _structure_breaks(text: str) -> dict[int, int]:
+    """
+    Character offsets where a chunk may start, mapped to a break priority.
+    Markdown headings start sections; paragraphs, list blocks and code
+    fences are blocks; list items and sentences are units. Inside a code
+    fence only line starts are allowed, and never right after a heading.
+    """
+    breaks: dict[int, int] = {}
+    in_fence = False
+    prev_blank = True
+    after_heading = False
+    pos = 0
+    for line in text.splitlines(keepends=True):
+        blank = not line.strip()
+        priority = 0
+        if in_fence:
+            priority = _LINE
+            if _FENCE.match(line):
+                in_fence = False
+                blank = True  # whatever follows the fence starts a new block
+        elif _FENCE.match(line):
+            priority = _BLOCK
+            in_fence = True
+        elif _HEADING_LINE.match(line):
+            priority = _HEADING
+        elif not blank:
+            if _LIST_ITEM.match(line):
+                priority = _BLOCK if prev_blank else _UNIT
+            else:
+                priority = _BLOCK if prev_blank else _LINE
+            for match in _SENTENCE_BREAK.finditer(line):
+                if match.end() < len(line):
+                    breaks.setdefault(pos + match.end(), _UNIT)
+        if priority and not (after_heading and priority != _HEADING):
+            breaks[pos] = max(priority, breaks.get(pos, 0))
+        if not blank:
+            after_heading = priority == _HEADING
+        prev_blank = blank
+        pos += len(line)
+    return breaks
+
+
+def chunk_structured(text: str, page_starts: list[int] | None = None) -> list[ChunkSpan]:
+    """
+    Split text into windows of at most ``chunk_size`` tokens that overlap the
+    previous window by exactly ``chunk_overlap`` tokens (not across a heading).
+
+    Each window ends at the strongest structural break past its first
+    quarter (heading > block > list item/sentence > line), or anywhere
+    after the overlap if there is none. A window with no break at all is
+    cut at the token limit.
+    """
+    settings = get_settings()
+    size = settings.chunk_size
+    overlap = min(settings.chunk_overlap, size // 2)
+
+    starts = _TokenOffsets(text).starts
+    n = len(starts)
+    # A break belongs to the token containing it: " Word" carries the space before it
+    priority: dict[int, int] = {}
+    for pos, p in _structure_breaks(text).items():
+        t = max(bisect_right(starts, pos) - 1, 0)
+        if t > 0 and p > priority.get(t, 0):
+            priority[t] = p
+    break_tokens = sorted(priority)
+
+    spans = []
+    t0 = 0
+    while t0 < n:
+        limit = min(t0 + size, n)
+        if limit == n:
+            t1 = n
+        else:
+            t1 = (
+                _best_break(break_tokens, priority, max(t0 + size // 4, t0 + overlap + 1), limit)
+                or _best_break(break_tokens, priority, t0 + overlap + 1, limit)
+                or limit
+            )
+        span = _make_span(text, starts, t0, t1, page_starts)
+        if span is not None:
+            spans.append(span)
+        if t1 >= n:
+            break
+        t0 = t1 if priority.get(t1) == _HEADING else t1 - overlap
+    return spans
+
+
+def _best_break(break_tokens: list[int], priority: dict[int, int], lo: int, hi: int) -> int | None:
+    """Latest of the highest-priority break tokens in [lo, hi]."""
+    best = None
+    for t in break_tokens[bisect_left(break_tokens, lo):bisect_right(break_tokens, hi)]:
+        if best is None or priority[t] >= priority[best]:
+            best = t
+    return best
+
+
+def _make_span(
+    text: str, starts: list[int], t0: int, t1: int, page_starts: list[int] | None
+) -> ChunkSpan | None:
+    char_start = starts[t0]
+    char_end = starts[t1] if t1 < len(starts) else len(text)
+    piece = text[char_start:char_end]
+    content = piece.strip()
+    if not content:
+        return None
+    char_start += len(piece) - len(piece.lstrip())
+    return ChunkSpan(
+        content=content,
+        page=bisect_right(page_starts, char_start) if page_starts else None,
+        char_start=char_start,
+        char_end=char_start + len(content),
+    )
+
+
+def iter_chunk_spans(pages: Iterable[str], window_pages: int = 8) -> Iterator[ChunkSpan]:
+    """
+    Chunk a document as its pages arrive (the document being the pages
+    joined by blank lines, as in ingestion).
+
+    Pages are chunked ``window_pages`` at a time. The last chunk of each
+    window is held back and re-chunked with the next window, so chunks still
+    run across page breaks; only seams between windows can differ from
+    chunking the whole text at once.
+    """
+    page_starts: list[int] = []
+    doc_len = 0
+    buffer_start = 0  # document offset of the first character of buffer
+    buffer: list[str] = []
+    buffered_pages = 0
+
+    def flush(final: bool) -> Iterator[ChunkSpan]:
+        nonlocal buffer, buffer_start
+        text = "\n\n".join(buffer)
+        spans = chunk_document(text)
+        held = None if final or len(spans) < 2 else spans.pop()
+        for span in spans:
+            if span.char_start is not None and span.char_end is not None:
+                span.char_start += buffer_start
+                span.char_end += buffer_start
+                span.page = bisect_right(page_starts, span.char_start) if page_starts else None
+            yield span
+        if held is None:
+            buffer, buffer_start = [], doc_len + 2
+        elif held.char_start is not None:
+            buffer, buffer_start = [text[held.char_start:]], buffer_start + held.char_start
+        else:
+            # Paragraph mode has no offsets; carry the chunk's (normalized) text instead
+            buffer = [held.content]
+
+    for i, page in enumerate(pages):
+        if i:
+            doc_len += 2
+        page_starts.append(doc_len)
+        doc_len += len(page)
+        buffer.append(page)
+        buffered_pages += 1
+        if buffered_pages >= window_pages:
+            yield from flush(final=False)
+            buffered_pages = 0
+    if buffer:
+        yield from flush(final=True)
@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from app.config import get_settings
+from app.services.cache import TTLCache
+
+_memory: TTLCache | None = None
+_store: "_SqliteTier | None" = None
+_store_checked = False
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a query, so trivial retypes share an entry."""
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def cache_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\n{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+
+class _SqliteTier:
+    """Persistent tier: float32 vectors in a local SQLite file, evicting least recently used rows."""
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "create table if not exists query_embeddings ("
+            " key text primary key, model text not null,"
+            " vector blob not null, last_used real not null)"
+        )
+        self._conn.execute(
+            "create index if not exists idx_query_embeddings_last_used"
+            " on query_embeddings (last_used)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> list[float] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "select vector from query_embeddings where key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "update query_embeddings set last_used = ? where key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        return array("f", row[0]).tolist()
+
+    def set(self, key: str, model: str, vector: list[float]) -> None:
+        blob = array("f", vector).tobytes()
+        with self._lock:
+            self._conn.execute(
+                "insert or replace into query_embeddings (key, model, vector, last_used)"
+                " values (?, ?, ?, ?)",
+                (key, model, blob, time.time()),
+            )
+            (count,) = self._conn.execute("select count(*) from query_embeddings").fetchone()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                # Evict in slabs so we don't pay for a delete on every insert.
+                overflow = max(overflow, self.max_entries // 10)
+                self._conn.execute(
+                    "delete from query_embeddings where key in ("
+                    " select key from query_embeddings order by last_used limit ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            (count,) = self._conn.execute("select count(*) from query_embeddings").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "size": count,
+            "maxsize": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _get_memory() -> TTLCache:
+    global _memory
+    if _memory is None:
+        _memory = TTLCache(maxsize=get_settings().embedding_cache_size)
+    return _memory
+
+
+def _get_store() -> _SqliteTier | None:
+    global _store, _store_checked
+    if not _store_checked:
+        settings = get_settings()
+        if settings.embedding_cache_path:
+            _store = _SqliteTier(
+                settings.embedding_cache_path, settings.embedding_cache_persistent_max_entries
+            )
+        _store_checked = True
+    return _store
+
+
+async def get_cached_embedding(text: str, model: str) -> list[float] | None:
+    """Look the query up in memory, then in the persistent tier (promoting hits to memory)."""
+    key = cache_key(text, model)
+    memory = _get_memory()
+    vector = memory.get(key)
+    if vector is not None:
+        return vector
+    store = _get_store()
+    if store is None:
+        return None
+    vector = await asyncio.to_thread(store.get, key)
+    if vector is not None:
+        memory.set(key, vector)
+    return vector
+
+
+async def store_embedding(text: str, model: str, vector: list[float]) -> None:
+    key = cache_key(text, model)
+    _get_memory().set(key, vector)
+    store = _get_store()
+    if store is not None:
+        await asyncio.to_thread(store.set, key, model, vector)
+
+
+def embedding_cache_stats() -> dict:
+    store = _get_store()
+    return {
+        "memory": _get_memory().stats(),
+        "persistent": store.stats() if store is not None else None,
+    }
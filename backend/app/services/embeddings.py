@@ -1,7 +1,17 @@
-from openai import OpenAI
+import random
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from openai import APIConnectionError, APITimeoutError, AsyncOpenAI, InternalServerError, OpenAI, RateLimitError
 from app.config import get_settings
+from app.models import EmbeddingBatch
+from app.services.chunking import count_tokens
+from app.services.embedding_cache import get_cached_embedding, store_embedding
 
 _client: OpenAI | None = None
+_async_client: AsyncOpenAI | None = None
+
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
 
 
 def get_openai_client() -> OpenAI:
@@ -12,33 +22,153 @@ def get_openai_client() -> OpenAI:
     return _client
 
 
-def embed_text(text: str) -> list[float]:
-    """Generate embedding for a single text."""
+def get_async_openai_client() -> AsyncOpenAI:
+    global _async_client
+    if _async_client is None:
+        settings = get_settings()
+        _async_client = AsyncOpenAI(api_key=settings.openai_api_key)
+    return _async_client
+
+
+def embedding_model_id() -> str:
+    """
+    The configured model plus its output size, as stored in chunks.embedding_model,
+    e.g. "text-embedding-3-small" or "text-embedding-3-small@512".
+    """
     settings = get_settings()
-    client = get_openai_client()
+    if settings.embedding_dimensions:
+        return f"{settings.embedding_model}@{settings.embedding_dimensions}"
+    return settings.embedding_model
+
+
+def _dimensions() -> dict:
+    dimensions = get_settings().embedding_dimensions
+    return {"dimensions": dimensions} if dimensions else {}
+
+
+async def embed_text(text: str) -> list[float]:
+    """
+    Generate embedding for a single query text.
+    Repeated queries are served from the query-embedding cache.
+    """
+    settings = get_settings()
+    model_id = embedding_model_id()
+    cached = await get_cached_embedding(text, model_id)
+    if cached is not None:
+        return cached
+
+    client = get_async_openai_client()
     
-    response = client.embeddings.create(
+    response = await client.embeddings.create(
         model=settings.embedding_model,
-        input=text
+        input=text,
+        **_dimensions()
     )
     
-    return response.data[0].embedding
+    embedding = response.data[0].embedding
+    await store_embedding(text, model_id, embedding)
+    return embedding
+
+
+def pack_batches(token_counts: list[int], max_tokens: int, max_inputs: int) -> list[range]:
+    """
+    Group consecutive inputs into batches under both the per-request token
+    budget and the input-count cap. An input larger than the budget gets a
+    batch of its own.
+    """
+    batches = []
+    start, tokens = 0, 0
+    for i, n in enumerate(token_counts):
+        if i > start and (tokens + n > max_tokens or i - start >= max_inputs):
+            batches.append(range(start, i))
+            start, tokens = i, 0
+        tokens += n
+    if start < len(token_counts):
+        batches.append(range(start, len(token_counts)))
+    return batches
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Seconds to wait before retrying: the server's Retry-After if given, else jittered exponential backoff."""
+    settings = get_settings()
+    response = getattr(error, "response", None)
+    if response is not None:
+        headers = response.headers
+        try:
+            if "retry-after-ms" in headers:
+                return float(headers["retry-after-ms"]) / 1000 + random.uniform(0, 0.25)
+            if "retry-after" in headers:
+                return float(headers["retry-after"]) + random.uniform(0, 0.25)
+        except ValueError:
+            pass
+    cap = min(settings.embedding_retry_max_seconds, settings.embedding_retry_base_seconds * 2 ** attempt)
+    return random.uniform(0, cap)
 
 
-def embed_texts(texts: list[str]) -> list[list[float]]:
-    """Generate embeddings for multiple texts in batch."""
+def _embed_batch(index: int, texts: list[str], tokens: int) -> tuple[list[list[float]], EmbeddingBatch]:
+    settings = get_settings()
+    # Retries are ours, so 429s honor Retry-After and the attempt count is visible
+    client = get_openai_client().with_options(max_retries=0)
+    started = time.perf_counter()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            response = client.embeddings.create(model=settings.embedding_model, input=texts, **_dimensions())
+            break
+        except RETRYABLE_ERRORS as e:
+            if attempt >= settings.embedding_max_attempts:
+                raise
+            time.sleep(_retry_delay(e, attempt - 1))
+    # Sort by index to maintain order
+    sorted_data = sorted(response.data, key=lambda x: x.index)
+    timing = EmbeddingBatch(
+        index=index,
+        inputs=len(texts),
+        tokens=tokens,
+        attempts=attempt,
+        seconds=round(time.perf_counter() - started, 3),
+    )
+    return [item.embedding for item in sorted_data], timing
+
+
+def embed_texts(
+    texts: list[str],
+    on_batch: Callable[[EmbeddingBatch], None] | None = None,
+) -> list[list[float]]:
+    """
+    Generate embeddings for many texts.
+
+    Inputs are packed into token-bounded batches that run concurrently
+    (embedding_concurrency at a time). Rate limits and transient errors are
+    retried per batch. ``on_batch`` receives each batch's timing as it finishes.
+    """
     if not texts:
         return []
-    
+
     settings = get_settings()
-    client = get_openai_client()
-    
-    # OpenAI API supports batch embedding
-    response = client.embeddings.create(
-        model=settings.embedding_model,
-        input=texts
+    token_counts = [count_tokens(t, settings.embedding_model) for t in texts]
+    batches = pack_batches(
+        token_counts, settings.embedding_batch_max_tokens, settings.embedding_batch_max_inputs
     )
-    
-    # Sort by index to maintain order
-    sorted_data = sorted(response.data, key=lambda x: x.index)
-    return [item.embedding for item in sorted_data]
+
+    embeddings: list[list[float]] = [[] for _ in texts]
+    workers = max(1, min(settings.embedding_concurrency, len(batches)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as pool:
+        futures = {
+            pool.submit(
+                _embed_batch, i, texts[batch.start:batch.stop], sum(token_counts[batch.start:batch.stop])
+            ): batch
+            for i, batch in enumerate(batches)
+        }
+        try:
+            for future in as_completed(futures):
+                vectors, timing = future.result()
+                embeddings[futures[future].start:futures[future].stop] = vectors
+                if on_batch is not None:
+                    on_batch(timing)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return embeddings
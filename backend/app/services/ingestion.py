@@ -0,0 +1,357 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import defaultdict
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from app.config import get_settings
+from app.db import get_supabase
+from app.models import EmbeddingBatch, UploadJob, UploadJobStage
+from app.services.cache import TTLCache
+from app.services.chunk_writer import WriteStats, copy_connection, insert_chunks
+from app.services.chunking import ChunkSpan, iter_pdf_pages
+from app.services.embeddings import embed_texts, embedding_model_id
+from app.services.ingestion_pipeline import ingest_stream
+from app.services.response_cache import invalidate_course
+from app.services.storage import upload_file_from_path
+from app.services.vector_index import rebuild_course_index
+
+STAGES = ("store", "extract", "chunk", "embed", "insert")
+# Hashes/ids per PostgREST in.() filter, to keep request URLs short
+HASH_QUERY_BATCH = 100
+
+_executor: ThreadPoolExecutor | None = None
+_jobs: TTLCache | None = None
+_executor_lock = threading.Lock()
+
+
+class IngestionError(Exception):
+    """A stage failed in a way retrying won't fix; the message is shown to the instructor."""
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_settings().ingestion_workers,
+                thread_name_prefix="ingest",
+            )
+    return _executor
+
+
+def _get_jobs() -> TTLCache:
+    global _jobs
+    if _jobs is None:
+        _jobs = TTLCache(maxsize=1_000, ttl=24 * 3600)
+    return _jobs
+
+
+def get_job(job_id: str) -> UploadJob | None:
+    return _get_jobs().get(job_id)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _start_stage(job: UploadJob, name: str, total: int | None = None) -> UploadJobStage:
+    stage = job.stages[name]
+    stage.status = "running"
+    stage.total = total
+    stage.attempts += 1
+    job.updated_at = _now()
+    return stage
+
+
+def _finish_stage(job: UploadJob, name: str) -> None:
+    stage = job.stages[name]
+    stage.status = "succeeded"
+    if stage.total is not None:
+        stage.completed = stage.total
+    job.updated_at = _now()
+
+
+def submit_upload(
+    course_id: str,
+    instructor_id: str,
+    filename: str,
+    path: str,
+    content_type: str,
+) -> UploadJob:
+    """
+    Queue a spooled upload for background ingestion and return its job record
+    immediately. The job takes ownership of the file at ``path`` and deletes it
+    when it finishes.
+    """
+    now = _now()
+    job = UploadJob(
+        id=str(uuid.uuid4()),
+        course_id=course_id,
+        instructor_id=instructor_id,
+        filename=filename,
+        status="queued",
+        stages={name: UploadJobStage() for name in STAGES},
+        created_at=now,
+        updated_at=now,
+    )
+    _get_jobs().set(job.id, job)
+    _get_executor().submit(_run_job, job, path, content_type)
+    return job
+
+
+def _run_job(job: UploadJob, path: str, content_type: str) -> None:
+    job.status = "running"
+    job.updated_at = _now()
+    try:
+        job.chunks_created = _ingest(job, path, content_type)
+        job.status = "succeeded"
+    except Exception as e:
+        for stage in job.stages.values():
+            if stage.status == "running":
+                stage.status = "failed"
+        job.status = "failed"
+        job.error = str(e) if isinstance(e, IngestionError) else f"Ingestion failed: {e}"
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+    job.updated_at = _now()
+
+
+def _ingest(job: UploadJob, path: str, content_type: str) -> int:
+    settings = get_settings()
+    supabase = get_supabase()
+    course_id, filename = job.course_id, job.filename
+    storage_path = f"{course_id}/{filename}"
+    # Vectors are only reused across the same model and output size
+    model_id = embedding_model_id()
+
+    # A re-upload replaces the earlier file of the same name. Its chunks whose
+    # content is unchanged stay as they are, and any chunk already embedded
+    # elsewhere in the course lends its vector, so only new text is embedded.
+    same_name = (
+        supabase.table("course_files").select("id").eq("course_id", course_id)
+        .eq("filename", filename).order("created_at").execute()
+    ).data or []
+    by_hash: dict[str, list[dict]] = defaultdict(list)
+    stale: list[str] = []
+    if same_name:
+        job.file_id = same_name[0]["id"]
+        rows = (
+            supabase.table("chunks")
+            .select("id, chunk_index, page, char_start, char_end, content_hash, embedding_model")
+            .eq("course_id", course_id).eq("file_id", job.file_id).execute()
+        ).data or []
+        for row in rows:
+            if row["content_hash"] and row["embedding_model"] == model_id:
+                by_hash[row["content_hash"]].append(row)
+            else:
+                stale.append(row["id"])
+    else:
+        file_result = supabase.table("course_files").insert({
+            "course_id": course_id,
+            "filename": filename,
+            "storage_path": storage_path
+        }).execute()
+        if not file_result.data:
+            raise IngestionError("Failed to create file record")
+        job.file_id = file_result.data[0]["id"]
+
+    is_pdf = filename.lower().endswith(".pdf")
+    counts_lock = threading.Lock()
+    # What this run changed in a re-uploaded file's rows, to undo if it fails
+    inserted: list[str] = []
+    moved_from: list[dict] = []
+    written = WriteStats()
+    # Summed across pipeline threads under counts_lock, then copied onto the job
+    created = reused = embedded = 0
+    saw_text = False
+    for name in ("extract", "chunk", "embed", "insert"):
+        _start_stage(job, name)
+
+    def pages() -> Iterator[str]:
+        nonlocal saw_text
+        source = iter_pdf_pages(path) if is_pdf else _read_text(path)
+        for page in source:
+            saw_text = saw_text or bool(page.strip())
+            job.stages["extract"].completed += 1
+            yield page
+
+    def plan(first: int, spans: list[ChunkSpan]) -> list[dict]:
+        """Chunk records to write: new chunks, and kept rows whose position changed."""
+        records = []
+        kept = 0
+        for i, span in enumerate(spans, start=first):
+            record = {
+                "course_id": course_id,
+                "file_id": job.file_id,
+                "chunk_index": i,
+                "content": span.content,
+                "content_hash": content_hash(span.content),
+                "embedding_model": model_id,
+                **_location(span),
+            }
+            if by_hash[record["content_hash"]]:
+                row = by_hash[record["content_hash"]].pop()
+                kept += 1
+                if row["chunk_index"] != i or any(row[k] != v for k, v in _location(span).items()):
+                    records.append({"id": row["id"], **record})
+                    moved_from.append(row)
+            else:
+                records.append(record)
+        nonlocal created, reused
+        with counts_lock:
+            created += len(spans)
+            reused += kept
+            job.stages["chunk"].completed += len(spans)
+            job.updated_at = _now()
+        return records
+
+    def on_batch(batch: EmbeddingBatch) -> None:
+        with counts_lock:
+            job.embedding_batches.append(batch)
+            job.stages["embed"].attempts = max(job.stages["embed"].attempts, batch.attempts)
+            job.updated_at = _now()
+
+    def embed(records: list[dict]) -> None:
+        nonlocal embedded, reused
+        new = [r for r in records if "id" not in r]
+        vectors = _existing_embeddings(course_id, model_id, {r["content_hash"] for r in new})
+        missing = {r["content_hash"]: r["content"] for r in new if r["content_hash"] not in vectors}
+        # Rate limits and timeouts are retried per batch inside embed_texts
+        vectors.update(zip(missing, embed_texts(list(missing.values()), on_batch=on_batch)))
+        for record in new:
+            record["embedding"] = vectors[record["content_hash"]]
+        fresh = sum(1 for r in new if r["content_hash"] in missing)
+        with counts_lock:
+            embedded += fresh
+            reused += len(new) - fresh
+            job.stages["embed"].completed += len(new)
+
+    def write(records: list[dict]) -> None:
+        moved = [r for r in records if "id" in r]
+        new = [r for r in records if "id" not in r]
+        if moved:
+            # Conflicts resolve on the primary key, (course_id, id)
+            supabase.table("chunks").upsert(moved).execute()
+        if new:
+            for record in new:
+                record["id"] = str(uuid.uuid4())
+            with counts_lock:
+                inserted.extend(r["id"] for r in new)
+            written.add(insert_chunks(new, copy_conn))  # opened around the pipeline below
+        job.stages["insert"].completed += len(records)
+        job.updated_at = _now()
+
+    # The original file goes to storage while the pipeline runs
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-store") as store_pool:
+        _start_stage(job, "store")
+        stored = store_pool.submit(upload_file_from_path, storage_path, path, content_type)
+        try:
+            # One COPY connection for the job's insert batches (None on the PostgREST path)
+            with copy_connection() as copy_conn:
+                stats = ingest_stream(
+                    pages(),
+                    plan=plan,
+                    embed=embed,
+                    write=write,
+                    batch_size=min(settings.ingestion_batch_size, settings.embedding_batch_max_inputs),
+                    embed_concurrency=settings.embedding_concurrency,
+                    queue_size=settings.ingestion_queue_size,
+                    window_pages=settings.ingestion_window_pages,
+                    paged=is_pdf,
+                )
+            job.chunks_created, job.chunks_reused, job.chunks_embedded = created, reused, embedded
+            if not saw_text:
+                raise IngestionError("No text content found in file")
+            if not created:
+                raise IngestionError("No chunks generated from file")
+            try:
+                stored.result()
+            except Exception as e:
+                raise IngestionError(f"Failed to upload file to storage: {e}")
+        except Exception:
+            # A new file's partial chunks go with its row. A failed re-upload is
+            # undone so the earlier version is served unchanged, not mixed with this one.
+            if same_name:
+                _undo_reupload(course_id, inserted, moved_from)
+            else:
+                supabase.table("course_files").delete().eq("id", job.file_id).execute()
+            invalidate_course(course_id)
+            rebuild_course_index(course_id)
+            raise
+        _finish_stage(job, "store")
+
+    job.insert_rows_per_second = round(written.rows_per_second, 1)
+    for name, stage_stats in stats.items():
+        job.stages[name].busy_seconds = round(stage_stats.busy_seconds, 3)
+        job.stages[name].total = job.stages[name].completed
+        _finish_stage(job, name)
+
+    # Old chunks that didn't match anything, and older duplicates of this
+    # filename (from before re-uploads were merged) along with their chunks
+    stale.extend(row["id"] for rows_left in by_hash.values() for row in rows_left)
+    job.chunks_deleted = len(stale)
+    for start in range(0, len(stale), HASH_QUERY_BATCH):
+        supabase.table("chunks").delete().eq("course_id", course_id).in_(
+            "id", stale[start:start + HASH_QUERY_BATCH]
+        ).execute()
+    for dup in same_name[1:]:
+        supabase.table("course_files").delete().eq("id", dup["id"]).execute()
+    invalidate_course(course_id)
+    rebuild_course_index(course_id)
+
+    return created
+
+
+def _undo_reupload(course_id: str, inserted: list[str], moved_from: list[dict]) -> None:
+    """Delete the chunk rows a failed re-upload inserted and put moved rows back where they were."""
+    supabase = get_supabase()
+    for start in range(0, len(inserted), HASH_QUERY_BATCH):
+        supabase.table("chunks").delete().eq("course_id", course_id).in_(
+            "id", inserted[start:start + HASH_QUERY_BATCH]
+        ).execute()
+    for row in moved_from:
+        supabase.table("chunks").update({
+            "chunk_index": row["chunk_index"],
+            "page": row["page"],
+            "char_start": row["char_start"],
+            "char_end": row["char_end"],
+        }).eq("course_id", course_id).eq("id", row["id"]).execute()
+
+
+def _read_text(path: str) -> Iterator[str]:
+    with open(path, encoding="utf-8") as f:
+        yield f.read()
+
+
+def _location(span: ChunkSpan) -> dict:
+    return {"page": span.page, "char_start": span.char_start, "char_end": span.char_end}
+
+
+def content_hash(text: str) -> str:
+    """Hex SHA-256 of a chunk's text; matches the backfill in migration 005."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _existing_embeddings(course_id: str, model: str, hashes: set[str]) -> dict[str, list[float]]:
+    """Vectors already stored in the course for these content hashes, embedded with ``model``."""
+    supabase = get_supabase()
+    wanted = sorted(hashes)
+    found: dict[str, list[float]] = {}
+    for start in range(0, len(wanted), HASH_QUERY_BATCH):
+        rows = (
+            supabase.table("chunks").select("content_hash, embedding")
+            .eq("course_id", course_id).eq("embedding_model", model)
+            .in_("content_hash", wanted[start:start + HASH_QUERY_BATCH]).execute()
+        ).data or []
+        for row in rows:
+            embedding = row["embedding"]
+            # PostgREST returns pgvector columns as their text form, e.g. "[0.1,0.2]"
+            found[row["content_hash"]] = json.loads(embedding) if isinstance(embedding, str) else embedding
+    return found
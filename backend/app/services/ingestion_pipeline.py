@@ -0,0 +1,225 @@
+"""
+Staged ingestion: extract pages -> chunk -> embed -> insert.
+
+Each stage runs in its own thread and hands items to the next through a
+bounded queue, so extraction, chunking, embedding and inserts overlap and a
+slow stage applies backpressure upstream instead of letting work pile up in
+memory. End-to-end time approaches the slowest stage rather than the sum.
+
+The work itself is injected (``plan``, ``embed``, ``write``), so
+ingestion.py runs the pipeline against Supabase/OpenAI and
+benchmarks/ingestion.py runs it against stubs.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from pydantic import BaseModel
+
+from app.services.chunking import ChunkSpan, iter_chunk_spans
+
+Stage = Callable[[Iterator], Iterator]
+Sink = Callable[[Any], None]
+
+_DONE = object()
+
+
+class StageStats(BaseModel):
+    items: int = 0
+    # Time spent producing output, excluding waits on the stage's input
+    busy_seconds: float = 0.0
+
+
+class _Cancelled(Exception):
+    """Another stage failed; unwind quietly so its error is the one raised."""
+
+
+def _metered(name: str, stage: Stage, upstream: Iterator, stats: dict[str, StageStats]) -> Iterator:
+    waited = 0.0
+
+    def inputs() -> Iterator:
+        nonlocal waited
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(upstream)
+            except StopIteration:
+                waited += time.perf_counter() - started
+                return
+            waited += time.perf_counter() - started
+            yield item
+
+    outputs = stage(inputs())
+    spent = 0.0
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(outputs)
+        except StopIteration:
+            spent += time.perf_counter() - started
+            break
+        spent += time.perf_counter() - started
+        stats[name].items += 1
+        stats[name].busy_seconds = spent - waited
+        yield item
+    stats[name].busy_seconds = spent - waited
+
+
+def run_stages(
+    source: Iterable,
+    stages: Sequence[tuple[str, Stage]],
+    sink: tuple[str, Sink],
+    queue_size: int = 4,
+    threaded: bool = True,
+) -> dict[str, StageStats]:
+    """
+    Feed ``source`` through each stage (a generator over its input) and pass
+    every final item to the sink. ``stages`` and ``sink`` are (name, callable)
+    pairs; the source is reported as "source". With ``threaded`` each stage
+    runs in its own thread behind a ``queue_size`` queue; without, stages are
+    chained in the calling thread and their times add up (the baseline).
+    The first error raised by any stage stops the others and is re-raised.
+    """
+    sink_name, sink_fn = sink
+    stats = {name: StageStats() for name in ["source", *(n for n, _ in stages), sink_name]}
+
+    def consume(items: Iterator) -> None:
+        for item in items:
+            started = time.perf_counter()
+            sink_fn(item)
+            stats[sink_name].busy_seconds += time.perf_counter() - started
+            stats[sink_name].items += 1
+
+    source_items = _metered("source", lambda _: iter(source), iter(()), stats)
+    if not threaded:
+        items = source_items
+        for name, stage in stages:
+            items = _metered(name, stage, items, stats)
+        consume(items)
+        return stats
+
+    cancelled = threading.Event()
+    errors: list[BaseException] = []
+    queues: list[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in stages]
+    queues.append(queue.Queue(maxsize=queue_size))
+
+    def put(q: queue.Queue, item) -> None:
+        while not cancelled.is_set():
+            try:
+                q.put(item, timeout=0.05)
+                return
+            except queue.Full:
+                pass
+        raise _Cancelled()
+
+    def drain(q: queue.Queue) -> Iterator:
+        while True:
+            try:
+                item = q.get(timeout=0.05)
+            except queue.Empty:
+                if cancelled.is_set():
+                    raise _Cancelled()
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    def run(items: Iterator, out: queue.Queue) -> None:
+        try:
+            for item in items:
+                put(out, item)
+            put(out, _DONE)
+        except _Cancelled:
+            pass
+        except BaseException as e:
+            errors.append(e)
+            cancelled.set()
+
+    threads = [threading.Thread(target=run, args=(source_items, queues[0]), daemon=True)]
+    for i, (name, stage) in enumerate(stages):
+        items = _metered(name, stage, drain(queues[i]), stats)
+        threads.append(threading.Thread(target=run, args=(items, queues[i + 1]), daemon=True))
+    for thread in threads:
+        thread.start()
+    try:
+        consume(drain(queues[-1]))
+    except _Cancelled:
+        pass
+    except BaseException as e:
+        errors.append(e)
+        cancelled.set()
+    finally:
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return stats
+
+
+def _batched(items: Iterator, size: int) -> Iterator[list]:
+    while batch := list(islice(items, size)):
+        yield batch
+
+
+def ingest_stream(
+    pages: Iterable[str],
+    *,
+    plan: Callable[[int, list[ChunkSpan]], list[dict]],
+    embed: Callable[[list[dict]], None],
+    write: Callable[[list[dict]], None],
+    batch_size: int = 64,
+    embed_concurrency: int = 4,
+    queue_size: int = 4,
+    window_pages: int = 8,
+    paged: bool = True,
+    threaded: bool = True,
+) -> dict[str, StageStats]:
+    """
+    Run one document through the ingestion stages.
+
+    - extract: ``pages`` is consumed lazily, so a page iterator overlaps parsing with the rest
+    - chunk: spans are chunked as pages arrive and ``plan(first_index, spans)`` turns
+      each batch of ``batch_size`` into chunk records
+    - embed: ``embed(records)`` fills in each record's ``embedding``, with up to
+      ``embed_concurrency`` batches in flight (results stay in document order)
+    - insert: ``write(records)`` stores each batch
+
+    Returns per-stage item counts and busy time, keyed by those stage names.
+    """
+
+    def chunk(page_texts: Iterator[str]) -> Iterator[list[dict]]:
+        spans = iter_chunk_spans(page_texts, window_pages)
+        if not paged:
+            spans = (span.model_copy(update={"page": None}) for span in spans)
+        first = 0
+        for batch in _batched(spans, batch_size):
+            yield plan(first, batch)
+            first += len(batch)
+
+    def embed_batches(batches: Iterator[list[dict]]) -> Iterator[list[dict]]:
+        def run(records: list[dict]) -> list[dict]:
+            embed(records)
+            return records
+
+        with ThreadPoolExecutor(max_workers=embed_concurrency, thread_name_prefix="embed") as pool:
+            in_flight = deque()
+            for batch in batches:
+                in_flight.append(pool.submit(run, batch))
+                if len(in_flight) >= embed_concurrency:
+                    yield in_flight.popleft().result()
+            while in_flight:
+                yield in_flight.popleft().result()
+
+    stats = run_stages(
+        pages,
+        [("chunk", chunk), ("embed", embed_batches)],
+        ("insert", write),
+        queue_size=queue_size,
+        threaded=threaded,
+    )
+    return {"extract": stats.pop("source"), **stats}
@@ -1,4 +1,10 @@
 import json
+from typing import AsyncIterator
+
+from openai import AsyncStream
+from openai.types.chat import ChatCompletionChunk, ChatCompletionMessageParam
+from openai.types.shared_params import ResponseFormatJSONSchema
+
 from app.config import get_settings
 from app.models import (
     Guardrails, HintControllerInput, HintControllerOutput, Excerpt, Source
@@ -6,15 +12,24 @@ from app.models import (
 from app.prompts.hint_controller import HINT_CONTROLLER_PROMPT
 from app.prompts.student_assistant import STUDENT_ASSISTANT_PROMPT
 from app.prompts.redirect import SOCRATIC_REDIRECT_PROMPT, build_policy_acknowledgment
-from app.services.embeddings import get_openai_client
+from app.prompts.single_shot import SINGLE_SHOT_PROMPT, SINGLE_SHOT_SCHEMA
+from app.services.embeddings import get_async_openai_client
+from app.services.pre_controller import decide
 
 
-def run_hint_controller(input_data: HintControllerInput) -> HintControllerOutput:
+async def run_hint_controller(input_data: HintControllerInput, rules: bool = True) -> HintControllerOutput:
     """
     Run the hint controller to decide action and hint level.
+    Decisions the rules settle (see pre_controller.py) skip the model call;
+    ``rules=False`` is for callers that have already applied them.
     """
     settings = get_settings()
-    client = get_openai_client()
+    if rules:
+        decision = decide(input_data, classify=settings.hint_pre_controller)
+        if decision is not None:
+            return decision
+
+    client = get_async_openai_client()
     
     user_content = f"""STUDENT_MESSAGE: {input_data.student_message}
 
@@ -24,7 +39,7 @@ HINT_STATE: {json.dumps({"hint_level_used": input_data.hint_state.hint_level_use
 
 EXCERPT_HIT_COUNT: {input_data.excerpt_hit_count}"""
 
-    response = client.chat.completions.create(
+    response = await client.chat.completions.create(
         model=settings.chat_model,
         messages=[
             {"role": "system", "content": HINT_CONTROLLER_PROMPT},
@@ -49,21 +64,72 @@ EXCERPT_HIT_COUNT: {input_data.excerpt_hit_count}"""
     )
 
 
-def run_student_assistant(
+async def run_single_shot(
+    input_data: HintControllerInput,
+    excerpts: list[Excerpt],
+) -> tuple[HintControllerOutput, str, str]:
+    """
+    Topic tagging, hint controller and student assistant in one structured-output
+    completion. Returns (controller output, topic, answer). The hint level is
+    clamped like run_hint_controller's, with the raw level kept for breach detection.
+    Raises ValueError if the model refuses or its JSON is truncated or malformed.
+    """
+    settings = get_settings()
+    client = get_async_openai_client()
+
+    user_content = f"""STUDENT_MESSAGE: {input_data.student_message}
+
+GUARDRAILS: {input_data.guardrails.model_dump_json()}
+
+HINT_STATE: {json.dumps({"hint_level_used": input_data.hint_state.hint_level_used, "number_of_hints_given": input_data.hint_state.number_of_hints_given})}
+
+EXCERPTS:
+{_format_excerpts(excerpts)}"""
+
+    response = await client.chat.completions.create(
+        model=settings.chat_model,
+        messages=[
+            {"role": "system", "content": SINGLE_SHOT_PROMPT},
+            {"role": "user", "content": user_content}
+        ],
+        response_format=ResponseFormatJSONSchema(type="json_schema", json_schema=SINGLE_SHOT_SCHEMA),
+        temperature=0.3
+    )
+
+    choice = response.choices[0]
+    if choice.message.content is None:
+        # Structured outputs come back as a refusal instead of JSON when the model declines
+        raise ValueError(f"Single-shot completion returned no content: {choice.message.refusal}")
+    if choice.finish_reason != "stop":
+        raise ValueError(f"Single-shot completion did not finish: {choice.finish_reason}")
+    try:
+        result = json.loads(choice.message.content)
+        raw_hint_level = result["hint_level"]
+        controller_output = HintControllerOutput(
+            action=result["action"],
+            hint_level=min(raw_hint_level, input_data.guardrails.max_hint_level),
+            raw_hint_level=raw_hint_level,
+            notes_for_assistant="",
+            student_requested_code=result["student_requested_code"],
+            student_requested_worked_example=result["student_requested_worked_example"],
+        )
+        topic = result["topic"].strip().strip('"').strip("'")[:80] or "General"
+        answer = result["answer"]
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Single-shot completion returned malformed JSON: {e!r}") from e
+    if not isinstance(answer, str):
+        raise ValueError("Single-shot completion returned a non-string answer")
+    return controller_output, topic, answer
+
+
+def _student_assistant_messages(
     student_message: str,
     excerpts: list[Excerpt],
     guardrails: Guardrails,
     hint_level: int,
     controller_notes: str,
-    action: str = "answer",
-) -> tuple[str, list[Source]]:
-    """
-    Run the student assistant to generate a response.
-    Returns the response content and list of sources used.
-    """
-    settings = get_settings()
-    client = get_openai_client()
-    
+    action: str,
+) -> list[ChatCompletionMessageParam]:
     # Format excerpts for the prompt
     excerpts_text = ""
     for i, excerpt in enumerate(excerpts):
@@ -89,22 +155,76 @@ CONTROLLER_NOTES: {controller_notes}
 EXCERPTS:
 {excerpts_text if excerpts_text else "No excerpts available."}"""
 
-    response = client.chat.completions.create(
+    return [
+        {"role": "system", "content": STUDENT_ASSISTANT_PROMPT},
+        {"role": "user", "content": user_content}
+    ]
+
+
+async def run_student_assistant(
+    student_message: str,
+    excerpts: list[Excerpt],
+    guardrails: Guardrails,
+    hint_level: int,
+    controller_notes: str,
+    action: str = "answer",
+) -> tuple[str, list[Source]]:
+    """
+    Run the student assistant to generate a response.
+    Returns the response content and list of sources used.
+    """
+    settings = get_settings()
+    client = get_async_openai_client()
+
+    response = await client.chat.completions.create(
         model=settings.chat_model,
-        messages=[
-            {"role": "system", "content": STUDENT_ASSISTANT_PROMPT},
-            {"role": "user", "content": user_content}
-        ],
+        messages=_student_assistant_messages(
+            student_message, excerpts, guardrails, hint_level, controller_notes, action
+        ),
         temperature=0.3
     )
     
     response_content = response.choices[0].message.content
-    sources = _extract_sources(excerpts)
+    sources = extract_sources(excerpts)
     
     return response_content, sources
 
 
-def _extract_sources(excerpts: list[Excerpt]) -> list[Source]:
+async def stream_student_assistant(
+    student_message: str,
+    excerpts: list[Excerpt],
+    guardrails: Guardrails,
+    hint_level: int,
+    controller_notes: str,
+    action: str = "answer",
+) -> AsyncIterator[str]:
+    """
+    Streaming variant of run_student_assistant.
+    Yields text deltas as the completion is generated.
+    """
+    settings = get_settings()
+    client = get_async_openai_client()
+
+    stream = await client.chat.completions.create(
+        model=settings.chat_model,
+        messages=_student_assistant_messages(
+            student_message, excerpts, guardrails, hint_level, controller_notes, action
+        ),
+        temperature=0.3,
+        stream=True,
+    )
+    async for delta in _iter_deltas(stream):
+        yield delta
+
+
+async def _iter_deltas(stream: AsyncStream[ChatCompletionChunk]) -> AsyncIterator[str]:
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def extract_sources(excerpts: list[Excerpt]) -> list[Source]:
+    """One source per distinct file, in retrieval order."""
     seen: set[str] = set()
     sources: list[Source] = []
     for e in excerpts:
@@ -128,7 +248,27 @@ def _format_excerpts(excerpts: list[Excerpt]) -> str:
     return "\n".join(parts)
 
 
-def build_redirect_response(
+def _redirect_messages(
+    student_message: str,
+    excerpts: list[Excerpt],
+    clamped_hint_level: int,
+) -> list[ChatCompletionMessageParam]:
+    excerpts_text = _format_excerpts(excerpts)
+
+    user_content = f"""STUDENT_MESSAGE: {student_message}
+
+ALLOWED_HINT_LEVEL: {clamped_hint_level}
+
+EXCERPTS:
+{excerpts_text}"""
+
+    return [
+        {"role": "system", "content": SOCRATIC_REDIRECT_PROMPT},
+        {"role": "user", "content": user_content},
+    ]
+
+
+async def build_redirect_response(
     breaches: list[str],
     guardrails: Guardrails,
     student_message: str,
@@ -152,33 +292,55 @@ def build_redirect_response(
     )
 
     settings = get_settings()
-    client = get_openai_client()
-
-    excerpts_text = _format_excerpts(excerpts)
-
-    user_content = f"""STUDENT_MESSAGE: {student_message}
+    client = get_async_openai_client()
 
-ALLOWED_HINT_LEVEL: {clamped_hint_level}
-
-EXCERPTS:
-{excerpts_text}"""
-
-    response = client.chat.completions.create(
+    response = await client.chat.completions.create(
         model=settings.chat_model,
-        messages=[
-            {"role": "system", "content": SOCRATIC_REDIRECT_PROMPT},
-            {"role": "user", "content": user_content},
-        ],
+        messages=_redirect_messages(student_message, excerpts, clamped_hint_level),
         temperature=0.3,
     )
 
     socratic_redirect = response.choices[0].message.content
     combined = f"{acknowledgment}\n\n---\n\n{socratic_redirect}"
-    sources = _extract_sources(excerpts)
+    sources = extract_sources(excerpts)
 
     return combined, sources
 
 
+async def stream_redirect_response(
+    breaches: list[str],
+    guardrails: Guardrails,
+    student_message: str,
+    excerpts: list[Excerpt],
+    clamped_hint_level: int,
+    raw_hint_level: int,
+) -> AsyncIterator[str]:
+    """
+    Streaming variant of build_redirect_response.
+    Yields the policy acknowledgment and separator first, then the
+    Socratic redirect deltas as they are generated.
+    """
+    acknowledgment = build_policy_acknowledgment(
+        breaches=breaches,
+        raw_hint_level=raw_hint_level,
+        max_hint_level=guardrails.max_hint_level,
+        instructor_note=guardrails.instructor_note,
+    )
+    yield f"{acknowledgment}\n\n---\n\n"
+
+    settings = get_settings()
+    client = get_async_openai_client()
+
+    stream = await client.chat.completions.create(
+        model=settings.chat_model,
+        messages=_redirect_messages(student_message, excerpts, clamped_hint_level),
+        temperature=0.3,
+        stream=True,
+    )
+    async for delta in _iter_deltas(stream):
+        yield delta
+
+
 TOPIC_EXTRACTION_PROMPT = """You are a topic tagger for an educational Q&A system.
 Given a student's question and (optionally) the course excerpts it matched against,
 return a SHORT topic label (2-5 words) that captures the academic concept being asked about.
@@ -190,13 +352,13 @@ Rules:
 - Return ONLY the label string, nothing else."""
 
 
-def extract_topic(student_message: str, excerpts: list[Excerpt]) -> str:
+async def extract_topic(student_message: str, excerpts: list[Excerpt]) -> str:
     """
     Extract a short topic label from the student's message.
     Uses a lightweight LLM call with temperature=0 for consistency.
     """
     settings = get_settings()
-    client = get_openai_client()
+    client = get_async_openai_client()
 
     excerpt_context = ""
     if excerpts:
@@ -209,7 +371,7 @@ def extract_topic(student_message: str, excerpts: list[Excerpt]) -> str:
         user_content += f"\n\nMATCHED EXCERPTS:\n{excerpt_context}"
 
     try:
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=settings.chat_model,
             messages=[
                 {"role": "system", "content": TOPIC_EXTRACTION_PROMPT},
@@ -0,0 +1,179 @@
+"""
+Rule-based pre-controller for the hint controller.
+
+Most hint-controller decisions follow from the inputs alone:
+HINT_CONTROLLER_PROMPT's rule 1 (no excerpts: refuse), rule 2 (quiz or
+exam: hint level 0) and the rule 4 escalation schedule over HintState.
+The request flags come from a keyword classifier. ``decide`` applies
+these and returns None when the message is ambiguous, e.g. it mentions
+a solution without clearly asking for one. Only then is the LLM
+controller called.
+
+The classifier fails closed on programming: a keyword miss would report
+student_requested_code=False and skip the code_not_allowed guardrail, so
+any message that mentions code, a language or debugging goes to the LLM
+unless it is an unmistakable code request. Solution requests fail closed
+the same way: a message that points at a specific problem is only
+decided here if SOLUTION_REQUEST matched it.
+"""
+import re
+from typing import Literal
+
+from app.models import HintControllerInput, HintControllerOutput
+
+_stats = {"rules": 0, "llm": 0}
+
+
+def _patterns(*expressions: str) -> re.Pattern:
+    return re.compile("|".join(f"(?:{e})" for e in expressions), re.IGNORECASE)
+
+
+_ASK = r"\b(?:write|give|show|send|provide|generate|share|paste)\b"
+
+CODE_REQUEST = _patterns(
+    _ASK + r".{0,30}\b(?:code|program|script|snippet|implementation)\b",
+    r"\bwrite (?:me )?(?:a|an|the) (?:function|class|method|loop|query)\b",
+    r"\b(?:can|could) you (?:code|program|implement)\b",
+    r"\bimplement(?:ation of)?\b.{0,40}\b(?:in|using) (?:python|java|javascript|typescript|c\+\+|c#|c|go|rust|sql|matlab|r)\b",
+    r"\b(?:code|program|script) (?:for|that|to)\b",
+    r"```",
+)
+WORKED_EXAMPLE_REQUEST = _patterns(
+    r"\bworked[- ]out\b|\bworked example\b",
+    r"\bstep[- ]by[- ]step\b.{0,40}\b(?:solution|solve|answer|work(?:ing)?)\b",
+    r"\b(?:full|complete|entire|whole) (?:solution|example|working)\b",
+    r"\bshow me how to solve\b",
+    r"\bexample (?:problem|calculation) with (?:numbers|values)\b",
+)
+SOLUTION_REQUEST = _patterns(
+    r"\b(?:final|exact|correct) answer\b",
+    r"\b(?:just|simply) (?:give|tell|show) me\b",
+    r"\bwhat(?:'s| is) the answer\b",
+    r"\b(?:solve|do|finish|complete) (?:this|it|my \w+|the (?:problem|question|assignment|homework)) for me\b",
+    r"\bdo my (?:homework|assignment|problem set)\b",
+    r"\b(?:answers?|solutions?) (?:to|for) (?:question|problem|exercise|q)\s*\d",
+    r"\b(?:full|complete|entire|whole) (?:solution|answer)s?\b",
+)
+# Anything about programming; left to the LLM unless CODE_REQUEST matched
+CODE_TOPIC = _patterns(
+    r"\b(?:code[sd]?|coding|functions?|program\w*|quer(?:y|ies)|class(?:es)?|methods?|scripts?|snippets?|pseudocode|implement\w*|algorithms?)\b",
+    r"(?<!\w)(?:python|java|javascript|typescript|c\+\+|c#|golang|rust|sql|matlab|haskell|ruby|php|kotlin|swift|scala|bash|html|css|verilog)(?!\w)",
+    r"\b(?:in|using|with) (?:c|r|go)\b",
+    r"\b(?:debug\w*|errors?|exceptions?|bugs?|buggy|compil\w*|syntax|stack ?trace|segfault|traceback)\b",
+    r"```",
+)
+# Points at a specific problem, which may be a solution request the patterns missed; left to the LLM
+PROBLEM_REFERENCE = _patterns(
+    r"\b(?:problem|question|exercise|q)\s*#?\s*\d",
+    r"\bfor me\b",
+    r"\bequals?\b|\bequal to\b",
+)
+# Words that signal one of the requests above without a clear pattern; left to the LLM
+AMBIGUOUS = _patterns(
+    r"\b(?:example|solution|solve|answer)s?\b",
+)
+
+_NOTES = {
+    "refuse": "No course excerpts matched the question.",
+    "assessment": "Assessment in progress: review concepts only, no problem solving.",
+    "integrity": "The student asked for a solution; explain the approach without giving it.",
+    "escalate": [
+        "Conceptual nudge only.",
+        "Give a targeted hint toward the next step.",
+        "Give a structured hint that outlines the steps.",
+        "Walk through a similar example, not the student's problem.",
+    ],
+}
+
+
+def message_signature(message: str) -> str:
+    """
+    A cheap fingerprint of what the classifier sees in a message: which
+    request patterns match, and the numbers it mentions (so "problem 3" and
+    "problem 4" differ). Messages with different signatures can get
+    different decisions even when their embeddings are close.
+    """
+    matched = [
+        name for name, pattern in (
+            ("code", CODE_REQUEST), ("code_topic", CODE_TOPIC), ("example", WORKED_EXAMPLE_REQUEST),
+            ("solution", SOLUTION_REQUEST), ("problem", PROBLEM_REFERENCE), ("ambiguous", AMBIGUOUS),
+        )
+        if pattern.search(message)
+    ]
+    return ",".join(matched) + "|" + ",".join(re.findall(r"\d+(?:\.\d+)?", message))
+
+
+def _escalated_level(input_data: HintControllerInput) -> int:
+    """
+    Rule 4: one level per earlier hint in the session, never above
+    MAX_HINT_LEVEL. Level 3 (a worked example) only if worked examples are allowed.
+    """
+    guardrails = input_data.guardrails
+    ceiling = 3 if guardrails.allow_worked_examples else 2
+    return min(input_data.hint_state.number_of_hints_given, ceiling, guardrails.max_hint_level)
+
+
+def _output(
+    action: Literal["answer", "answer_with_integrity_refusal", "refuse_out_of_scope"],
+    hint_level: int,
+    notes: str,
+    code: bool = False,
+    example: bool = False,
+) -> HintControllerOutput:
+    return HintControllerOutput(
+        action=action,
+        hint_level=hint_level,
+        raw_hint_level=hint_level,
+        notes_for_assistant=notes,
+        student_requested_code=code,
+        student_requested_worked_example=example,
+        decided_by="rules",
+    )
+
+
+def decide(input_data: HintControllerInput, classify: bool = True) -> HintControllerOutput | None:
+    """
+    The controller's decision if the rules settle it, else None. With
+    ``classify`` off only rule 1 is applied, so every other message goes to the LLM.
+    """
+    if input_data.excerpt_hit_count == 0:
+        _stats["rules"] += 1
+        return _output("refuse_out_of_scope", 0, _NOTES["refuse"])
+    if not classify:
+        _stats["llm"] += 1
+        return None
+
+    message = input_data.student_message
+    code = bool(CODE_REQUEST.search(message))
+    example = bool(WORKED_EXAMPLE_REQUEST.search(message))
+    solution = bool(SOLUTION_REQUEST.search(message))
+    guardrails = input_data.guardrails
+
+    if not code and CODE_TOPIC.search(message):
+        decision = None  # may be a code request the patterns missed
+    elif not (code or example or solution) and AMBIGUOUS.search(message):
+        decision = None
+    elif guardrails.assessment_mode in ("quiz", "exam"):
+        decision = _output("answer", 0, _NOTES["assessment"], code, example)
+    elif code and guardrails.allow_code:
+        decision = None  # rule 3 covers code that solves the problem outright; a judgement call
+    elif solution and not guardrails.allow_final_answer:
+        # Rule 3: hint level 0 or 1
+        decision = _output(
+            "answer_with_integrity_refusal", min(_escalated_level(input_data), 1), _NOTES["integrity"], code, example
+        )
+    elif solution:
+        decision = None  # final answers allowed: how much to give is a judgement call
+    elif PROBLEM_REFERENCE.search(message):
+        decision = None  # may be a solution request the patterns missed
+    else:
+        level = _escalated_level(input_data)
+        decision = _output("answer", level, _NOTES["escalate"][level], code, example)
+
+    _stats["rules" if decision else "llm"] += 1
+    return decision
+
+
+def pre_controller_stats() -> dict:
+    decided = _stats["rules"] + _stats["llm"]
+    return {**_stats, "rules_rate": round(_stats["rules"] / decided, 4) if decided else 0.0}
@@ -0,0 +1,33 @@
+from uuid import UUID
+from app.config import get_settings
+from app.services.cache import TTLCache
+
+_cache: TTLCache | None = None
+
+
+def _get_cache() -> TTLCache:
+    global _cache
+    if _cache is None:
+        settings = get_settings()
+        _cache = TTLCache(
+            maxsize=settings.profile_cache_size,
+            ttl=settings.profile_cache_ttl_seconds,
+        )
+    return _cache
+
+
+def get_cached_profile(user_id: UUID | str) -> dict | None:
+    return _get_cache().get(str(user_id))
+
+
+def cache_profile(profile: dict) -> None:
+    _get_cache().set(str(profile["id"]), profile)
+
+
+def invalidate_profile(user_id: UUID | str) -> None:
+    """Drop a cached profile; call whenever a users row is created, changed or removed."""
+    _get_cache().pop(str(user_id))
+
+
+def profile_cache_stats() -> dict:
+    return _get_cache().stats()
@@ -0,0 +1,74 @@
+"""
+Re-ranking of over-fetched retrieval candidates.
+
+Retrieval fetches ``retrieval_rerank_candidates`` rows with their
+embeddings and keeps the best ``retrieval_top_k`` by Maximal Marginal
+Relevance, so adjacent near-duplicate chunks of one file don't fill the
+prompt. Relevance is the cosine similarity, or the score of a local
+cross-encoder when ``retrieval_cross_encoder_model`` is set (needs the
+optional ``sentence-transformers`` package).
+"""
+import json
+import threading
+
+import numpy as np
+
+try:
+    from sentence_transformers import CrossEncoder  # pyright: ignore[reportMissingImports]
+except ImportError:  # optional: only needed for cross-encoder scoring
+    CrossEncoder = None
+
+_cross_encoder = None
+_cross_encoder_lock = threading.Lock()
+
+
+def candidate_matrix(rows: list[dict]) -> np.ndarray:
+    """Unit-normalized float32 matrix of the candidates' embeddings (pgvector text or lists)."""
+    vectors = np.array(
+        [json.loads(r["embedding"]) if isinstance(r["embedding"], str) else r["embedding"] for r in rows],
+        dtype=np.float32,
+    )
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def mmr(relevance: np.ndarray, vectors: np.ndarray, k: int, diversity_lambda: float) -> list[int]:
+    """
+    Indices of ``k`` candidates chosen greedily by Maximal Marginal Relevance:
+    each pick maximizes lambda * relevance - (1 - lambda) * (max cosine
+    similarity to the candidates already picked).
+    """
+    n = len(relevance)
+    pairwise = vectors @ vectors.T
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    picked: list[int] = []
+    for _ in range(min(k, n)):
+        scores = diversity_lambda * relevance - (1 - diversity_lambda) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        np.maximum(redundancy, pairwise[best], out=redundancy)
+    return picked
+
+
+def _get_cross_encoder(model: str):
+    global _cross_encoder
+    if CrossEncoder is None:
+        raise RuntimeError(
+            "retrieval_cross_encoder_model is set but sentence-transformers is not installed "
+            "(pip install sentence-transformers)"
+        )
+    with _cross_encoder_lock:
+        if _cross_encoder is None:
+            _cross_encoder = CrossEncoder(model, device="cpu")
+    return _cross_encoder
+
+
+def cross_encoder_scores(model_name: str, query: str, contents: list[str]) -> np.ndarray:
+    """Cross-encoder relevance min-max scaled to [0, 1], comparable with the cosine redundancy term."""
+    model = _get_cross_encoder(model_name)
+    scores = np.asarray(model.predict([(query, c) for c in contents]), dtype=np.float32)
+    spread = scores.max() - scores.min()
+    return (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
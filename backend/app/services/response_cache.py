@@ -0,0 +1,160 @@
+import hashlib
+import time
+from uuid import UUID
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from app.config import get_settings
+from app.models import Guardrails, HintControllerOutput, HintState, Source
+from app.services.cache import TTLCache
+from app.services.pre_controller import message_signature
+
+
+class CachedAnswer(BaseModel):
+    content: str
+    sources: list[Source]
+    # The decision the answer was generated under, replayed on a hit
+    controller_output: HintControllerOutput
+    breaches: list[str]
+    policy_key: str
+    created_at: float = Field(default_factory=time.monotonic)
+
+
+class _CourseAnswers:
+    """Unit-normalized query embeddings of one course's cached answers, stacked for a single matmul."""
+
+    def __init__(self):
+        self.vectors: np.ndarray | None = None
+        self.answers: list[CachedAnswer] = []
+
+    def add(self, vector: np.ndarray, answer: CachedAnswer, max_entries: int) -> None:
+        row = vector[np.newaxis, :]
+        self.vectors = row if self.vectors is None else np.vstack([self.vectors, row])
+        self.answers.append(answer)
+        if len(self.answers) > max_entries:
+            drop = len(self.answers) - max_entries
+            self.vectors = self.vectors[drop:]
+            self.answers = self.answers[drop:]
+
+
+_courses: TTLCache | None = None
+_stats = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+
+def _get_courses() -> TTLCache:
+    global _courses
+    if _courses is None:
+        _courses = TTLCache(maxsize=get_settings().response_cache_max_courses)
+    return _courses
+
+
+def guardrails_version(guardrails: Guardrails) -> str:
+    return hashlib.sha1(guardrails.model_dump_json().encode("utf-8")).hexdigest()
+
+
+def _policy_key(message: str, guardrails: Guardrails, hint_state: HintState) -> str:
+    """
+    The hint controller's inputs: guardrails, the escalation step (rule 4
+    stops escalating after three hints) and the message's classifier
+    signature. Keying on these lets the lookup run before the controller
+    without replaying a decision made for a different kind of request, or
+    for a different numbered problem, that happens to embed nearby.
+    """
+    return (
+        f"{guardrails_version(guardrails)}|{min(hint_state.number_of_hints_given, 3)}"
+        f"|{message_signature(message)}"
+    )
+
+
+def _unit(vector: list[float]) -> np.ndarray:
+    arr = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(arr))
+    return arr / norm if norm else arr
+
+
+def lookup_answer(
+    course_id: UUID,
+    query_embedding: list[float],
+    message: str,
+    guardrails: Guardrails,
+    hint_state: HintState,
+) -> CachedAnswer | None:
+    """
+    Return an earlier answer in this course whose question is similar enough,
+    has the same classifier signature, and was produced under the same
+    guardrails and escalation step.
+    """
+    settings = get_settings()
+    if not settings.response_cache_enabled:
+        return None
+    course = _get_courses().get(str(course_id))
+    if course is None or course.vectors is None:
+        _stats["misses"] += 1
+        return None
+
+    key = _policy_key(message, guardrails, hint_state)
+    oldest = time.monotonic() - settings.response_cache_ttl_seconds
+    candidates = [
+        i for i, a in enumerate(course.answers)
+        if a.policy_key == key and a.created_at >= oldest
+    ]
+    if not candidates:
+        _stats["misses"] += 1
+        return None
+
+    scores = course.vectors[candidates] @ _unit(query_embedding)
+    best = int(np.argmax(scores))
+    if scores[best] < settings.response_cache_similarity_threshold:
+        _stats["misses"] += 1
+        return None
+    _stats["hits"] += 1
+    return course.answers[candidates[best]]
+
+
+def store_answer(
+    course_id: UUID,
+    query_embedding: list[float],
+    message: str,
+    guardrails: Guardrails,
+    hint_state: HintState,
+    controller_output: HintControllerOutput,
+    breaches: list[str],
+    content: str,
+    sources: list[Source],
+) -> None:
+    settings = get_settings()
+    if not settings.response_cache_enabled:
+        return
+    courses = _get_courses()
+    course = courses.get(str(course_id))
+    if course is None:
+        course = _CourseAnswers()
+        courses.set(str(course_id), course)
+    course.add(
+        _unit(query_embedding),
+        CachedAnswer(
+            content=content,
+            sources=sources,
+            controller_output=controller_output,
+            breaches=breaches,
+            policy_key=_policy_key(message, guardrails, hint_state),
+        ),
+        settings.response_cache_max_entries_per_course,
+    )
+    _stats["stores"] += 1
+
+
+def invalidate_course(course_id: UUID | str) -> None:
+    """Drop every cached answer for a course; call when its materials or guardrails change."""
+    _get_courses().pop(str(course_id))
+    _stats["invalidations"] += 1
+
+
+def response_cache_stats() -> dict:
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "courses": _get_courses().stats()["size"],
+        "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+    }
@@ -1,33 +1,141 @@
+import asyncio
+import time
 from uuid import UUID
-from app.db import get_supabase
+
+import numpy as np
+
+from app.db import get_async_supabase
 from app.config import get_settings
 from app.models import Excerpt
 from app.services.embeddings import embed_text
+from app.services.rerank import candidate_matrix, cross_encoder_scores, mmr
+from app.services.vector_index import get_course_index
+
+# stage -> [calls, total seconds], for /metrics
+_stage_times: dict[str, list[float]] = {}
+_gate_stats = {"rows_dropped": 0, "empty_results": 0}
+
+
+def _record(stage: str, started: float) -> float:
+    now = time.perf_counter()
+    totals = _stage_times.setdefault(stage, [0, 0.0])
+    totals[0] += 1
+    totals[1] += now - started
+    return now
 
 
-def retrieve_chunks(course_id: UUID, query: str) -> list[Excerpt]:
+def retrieval_stats() -> dict:
+    """Mean latency per retrieval stage (embed, search or local_search, cross_encoder, mmr) and gating counters in this worker."""
+    return {
+        "stages": {
+            stage: {"calls": int(calls), "mean_ms": round(seconds / calls * 1000, 2)}
+            for stage, (calls, seconds) in _stage_times.items()
+        },
+        **_gate_stats,
+    }
+
+
+def gate_by_relevance(
+    rows: list[dict],
+    min_similarity: float,
+    max_gap: float | None,
+    hybrid: bool = False,
+    lexical_min_similarity: float | None = None,
+) -> list[dict]:
+    """
+    Adaptive top-k: drop rows under ``min_similarity`` and, walking down the
+    similarity ranking, stop at the first drop larger than ``max_gap``.
+    In hybrid mode rows are in fused order, so only the threshold applies.
+    Full-text hits are held to the lower ``lexical_min_similarity`` (an
+    exact identifier match can have a modest cosine score) rather than
+    exempted: the full-text query ORs its terms, so a single shared common
+    word makes a row a lexical hit.
+    """
+    if hybrid:
+        lexical_floor = min_similarity if lexical_min_similarity is None else lexical_min_similarity
+        return [
+            r for r in rows
+            if r["similarity"] >= (lexical_floor if r.get("lexical_rank") is not None else min_similarity)
+        ]
+    kept: list[dict] = []
+    for row in rows:
+        if row["similarity"] < min_similarity:
+            break
+        if kept and max_gap is not None and kept[-1]["similarity"] - row["similarity"] > max_gap:
+            break
+        kept.append(row)
+    return kept
+
+
+async def retrieve_chunks(
+    course_id: UUID,
+    query: str,
+    mode: str | None = None,
+    query_embedding: list[float] | None = None,
+) -> list[Excerpt]:
     """
     Retrieve the most relevant chunks for a query within a course.
-    Uses pgvector for similarity search.
+    Uses pgvector for similarity search; in "hybrid" mode (``mode`` or the
+    retrieval_mode setting) it is fused with full-text search by reciprocal rank.
+    Rows below the relevance gate are dropped, so an off-topic query can come
+    back with fewer than k excerpts or none. With re-ranking on, extra
+    candidates are fetched and the top k are picked by MMR (see rerank.py).
+    With local_index_enabled, vector search runs in-process when the course
+    fits (see vector_index.py). Pass ``query_embedding`` when the caller
+    has already embedded the query.
     """
     settings = get_settings()
-    supabase = get_supabase()
+    supabase = await get_async_supabase()
+    top_k = settings.retrieval_top_k
+    rerank = settings.retrieval_rerank_candidates > top_k
     
     # Generate query embedding
-    query_embedding = embed_text(query)
+    started = time.perf_counter()
+    if query_embedding is None:
+        query_embedding = await embed_text(query)
+        started = _record("embed", started)
     
-    # Call the match_chunks RPC function
-    result = supabase.rpc("match_chunks", {
+    params = {
         "query_embedding": query_embedding,
         "match_course_id": str(course_id),
-        "match_count": settings.retrieval_top_k
-    }).execute()
+        "match_count": settings.retrieval_rerank_candidates if rerank else top_k,
+        "match_ef_search": settings.retrieval_hnsw_ef_search,
+        "match_probes": settings.retrieval_ivfflat_probes,
+        "match_with_embeddings": rerank,
+    }
+    hybrid = (mode or settings.retrieval_mode) == "hybrid"
+    candidates = None
+    if settings.local_index_enabled and not hybrid:
+        candidates = await asyncio.to_thread(_local_search, course_id, query_embedding, params["match_count"])
+        if candidates is not None:
+            started = _record("local_search", started)
+    if candidates is None:
+        if hybrid:
+            result = await supabase.rpc("match_chunks_hybrid", {
+                **params,
+                "query_text": query,
+                "match_candidates": max(settings.retrieval_hybrid_candidates, params["match_count"]),
+                "rrf_k": settings.retrieval_rrf_k,
+            }).execute()
+        else:
+            result = await supabase.rpc("match_chunks", params).execute()
+        candidates = result.data or []
+        started = _record("search", started)
     
-    if not result.data:
+    rows = gate_by_relevance(
+        candidates, settings.retrieval_min_similarity, settings.retrieval_max_score_gap, hybrid,
+        settings.retrieval_lexical_min_similarity,
+    )
+    _gate_stats["rows_dropped"] += len(candidates) - len(rows)
+    if not rows:
+        _gate_stats["empty_results"] += 1
         return []
     
+    if rerank and len(rows) > top_k:
+        rows = await _rerank(query, rows, top_k, started)
+    
     excerpts = []
-    for row in result.data:
+    for row in rows:
         excerpts.append(Excerpt(
             filename=row["filename"],
             chunk_index=row["chunk_index"],
@@ -36,3 +144,23 @@ def retrieve_chunks(course_id: UUID, query: str) -> list[Excerpt]:
         ))
     
     return excerpts
+
+
+def _local_search(course_id: UUID, query_embedding: list[float], k: int) -> list[dict] | None:
+    index = get_course_index(course_id)
+    return None if index is None else index.search(query_embedding, k)
+
+
+async def _rerank(query: str, rows: list[dict], k: int, started: float) -> list[dict]:
+    settings = get_settings()
+    if settings.retrieval_cross_encoder_model:
+        # CPU-bound model inference; keep it off the event loop
+        relevance = await asyncio.to_thread(
+            cross_encoder_scores, settings.retrieval_cross_encoder_model, query, [r["content"] for r in rows]
+        )
+        started = _record("cross_encoder", started)
+    else:
+        relevance = np.array([r["similarity"] for r in rows], dtype=np.float32)
+    picked = mmr(relevance, candidate_matrix(rows), k, settings.retrieval_mmr_lambda)
+    _record("mmr", started)
+    return [rows[i] for i in picked]
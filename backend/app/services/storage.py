@@ -0,0 +1,51 @@
+import os
+from collections.abc import Iterator
+from urllib.parse import quote
+
+import httpx
+
+from app.config import get_settings
+
+BUCKET = "course-files"
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+_http: httpx.Client | None = None
+
+
+def _get_http() -> httpx.Client:
+    global _http
+    if _http is None:
+        _http = httpx.Client(timeout=httpx.Timeout(30.0, write=300.0))
+    return _http
+
+
+def _read_chunks(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_BYTES):
+            yield chunk
+
+
+def upload_file_from_path(storage_path: str, path: str, content_type: str) -> None:
+    """
+    Stream a local file into the course-files bucket, replacing any existing object.
+
+    The body is sent in fixed-size chunks with an explicit Content-Length, so
+    memory use doesn't grow with the file size (storage3 reads it whole).
+    """
+    settings = get_settings()
+    url = (
+        f"{settings.supabase_url.rstrip('/')}/storage/v1/object/"
+        f"{BUCKET}/{quote(storage_path)}"
+    )
+    r = _get_http().post(
+        url,
+        content=_read_chunks(path),
+        headers={
+            "Authorization": f"Bearer {settings.supabase_service_key}",
+            "apikey": settings.supabase_service_key,
+            "Content-Type": content_type,
+            "Content-Length": str(os.path.getsize(path)),
+            "x-upsert": "true",
+        },
+    )
+    r.raise_for_status()
@@ -0,0 +1,293 @@
+"""
+In-process vector index for small and medium courses.
+
+A course's chunk embeddings are unit-normalized into one contiguous
+float32 matrix, saved as a .npy file under ``local_index_dir`` and
+memory-mapped, so top-k is a single matrix-vector product with no
+database round trip. ``<course_id>.json`` holds the chunk rows and names
+the current .npy file. Courses with more than ``local_index_max_chunks``
+chunks stay on the match_chunks RPC. With ``local_index_int8`` the matrix
+is stored as int8 with one float32 scale per row, a quarter of the size,
+and scored in float32 blocks.
+
+Indexes are built off the request path, on a background thread: after
+ingestion or a file delete changes a course's chunks, or when a query
+finds no index for the course. Until the build finishes the course is
+searched with pgvector. Other workers notice a rebuilt or removed file by
+its mtime.
+"""
+import glob
+import json
+import os
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import UUID
+
+import numpy as np
+from postgrest.types import CountMethod
+
+from app.config import get_settings
+from app.db import get_supabase
+from app.services.cache import TTLCache
+
+# PostgREST's default max-rows per response
+PAGE_SIZE = 1000
+# Rows of an int8 matrix converted to float32 at a time while scoring
+SCORE_BLOCK_ROWS = 1024
+
+logger = logging.getLogger(__name__)
+
+_indexes: TTLCache | None = None
+_build_locks: dict[str, threading.Lock] = {}
+_locks_lock = threading.Lock()
+_builder: ThreadPoolExecutor | None = None
+# Courses with a build queued or running
+_pending: set[str] = set()
+# Bumped on invalidation, so a build that raced a change doesn't publish stale files
+_generations: dict[str, int] = {}
+# Courses found over the size limit, until their chunks change
+_too_large: set[str] = set()
+
+
+class CourseIndex:
+    """
+    One course's embeddings (memory-mapped, unit-normalized) and the matching
+    chunk rows. int8 vectors come with ``scales``: row i is vectors[i] * scales[i].
+    """
+
+    def __init__(self, vectors: np.ndarray, rows: list[dict], mtime_ns: int, scales: np.ndarray | None = None):
+        self.vectors = vectors
+        self.rows = rows
+        self.mtime_ns = mtime_ns
+        self.scales = scales
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every row to a unit-length float32 query."""
+        if self.scales is None:
+            return self.vectors @ query
+        # NumPy has no int8 BLAS; converting in blocks bounds the float32 copy
+        scores = np.empty(len(self.vectors), dtype=np.float32)
+        for start in range(0, len(self.vectors), SCORE_BLOCK_ROWS):
+            block = self.vectors[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        return scores * self.scales
+
+    def search(self, query_embedding: list[float], k: int) -> list[dict]:
+        """Top ``k`` rows by cosine similarity, best first, in match_chunks' row shape."""
+        if not self.rows:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        scores = self.scores(query)
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [
+            {**self.rows[i], "similarity": float(scores[i]), "embedding": self.vectors[i]}
+            for i in top
+        ]
+
+
+def _get_indexes() -> TTLCache:
+    global _indexes
+    if _indexes is None:
+        _indexes = TTLCache(maxsize=get_settings().local_index_max_courses)
+    return _indexes
+
+
+def _manifest_path(course_id: str) -> str:
+    return os.path.join(get_settings().local_index_dir, course_id + ".json")
+
+
+def _vector_files(course_id: str) -> list[str]:
+    return glob.glob(os.path.join(get_settings().local_index_dir, course_id + ".*.npy"))
+
+
+def _get_builder() -> ThreadPoolExecutor:
+    global _builder
+    with _locks_lock:
+        if _builder is None:
+            # One build at a time: each holds a course's matrix while it is written
+            _builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-index")
+    return _builder
+
+
+def _build_lock(course_id: str) -> threading.Lock:
+    with _locks_lock:
+        return _build_locks.setdefault(course_id, threading.Lock())
+
+
+def _fetch_chunks(course_id: str) -> list[dict] | None:
+    """Every chunk of the course with its embedding and filename, or None if over the size limit."""
+    supabase = get_supabase()
+    count = (
+        supabase.table("chunks").select("id", count=CountMethod.exact, head=True)
+        .eq("course_id", course_id).execute()
+    ).count or 0
+    if count > get_settings().local_index_max_chunks:
+        return None
+    rows: list[dict] = []
+    while True:
+        page = (
+            supabase.table("chunks")
+            .select("id, file_id, chunk_index, content, embedding, course_files(filename)")
+            .eq("course_id", course_id).order("id")
+            .range(len(rows), len(rows) + PAGE_SIZE - 1).execute()
+        ).data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+
+
+def _embedding(value: str | list[float]) -> list[float]:
+    # PostgREST returns pgvector columns as their text form, e.g. "[0.1,0.2]"
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def quantize_int8(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantization: (int8 matrix, float32 scale per row)."""
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    return np.round(vectors / scales[:, np.newaxis]).astype(np.int8), scales.astype(np.float32)
+
+
+def _build(course_id: str) -> bool:
+    """Write the course's index files; False if the course is too large to index locally."""
+    generation = _generations.get(course_id, 0)
+    chunks = _fetch_chunks(course_id)
+    if chunks is None:
+        _too_large.add(course_id)
+        return False
+    chunks = [c for c in chunks if c.get("embedding") is not None and c.get("course_files")]
+    dims = len(_embedding(chunks[0]["embedding"])) if chunks else 0
+    vectors = np.empty((len(chunks), dims), dtype=np.float32)
+    rows = []
+    for i, chunk in enumerate(chunks):
+        vectors[i] = _embedding(chunk["embedding"])
+        rows.append({
+            "id": chunk["id"],
+            "course_id": course_id,
+            "file_id": chunk["file_id"],
+            "chunk_index": chunk["chunk_index"],
+            "content": chunk["content"],
+            "filename": chunk["course_files"]["filename"],
+        })
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms == 0, 1, norms)
+
+    if _generations.get(course_id, 0) != generation:
+        return True  # chunks changed mid-build; whatever changed them queued another build
+    manifest_path = _manifest_path(course_id)
+    directory = os.path.dirname(manifest_path)
+    os.makedirs(directory, exist_ok=True)
+    # Each build gets its own vectors file and the manifest is swapped in by
+    # rename, so readers always see a matching pair. Unlinking the old file
+    # doesn't disturb workers that still have it mapped.
+    build = f"{course_id}.{time.time_ns()}"
+    manifest = {"vectors": build + ".npy", "scales": None, "rows": rows}
+    if get_settings().local_index_int8:
+        vectors, scales = quantize_int8(vectors)
+        manifest["scales"] = build + ".scales.npy"
+        np.save(os.path.join(directory, manifest["scales"]), scales)
+    np.save(os.path.join(directory, manifest["vectors"]), vectors)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    for path in _vector_files(course_id):
+        if not os.path.basename(path).startswith(build + "."):
+            os.remove(path)
+    return True
+
+
+def _load(course_id: str) -> CourseIndex | None:
+    manifest_path = _manifest_path(course_id)
+    try:
+        mtime_ns = os.stat(manifest_path).st_mtime_ns
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        directory = os.path.dirname(manifest_path)
+        vectors = np.load(os.path.join(directory, manifest["vectors"]), mmap_mode="r")
+        scales = np.load(os.path.join(directory, manifest["scales"])) if manifest.get("scales") else None
+    except (FileNotFoundError, ValueError):
+        return None
+    return CourseIndex(vectors, manifest["rows"], mtime_ns, scales)
+
+
+def get_course_index(course_id: UUID | str) -> CourseIndex | None:
+    """
+    The course's index if it has been built, else None and the course
+    should use pgvector: over ``local_index_max_chunks``, or not built yet
+    (a background build is queued). Blocking file I/O; call from a worker thread.
+    """
+    key = str(course_id)
+    if key in _too_large:
+        return None
+    indexes = _get_indexes()
+    index = indexes.get(key)
+    if index is not None:
+        try:
+            if os.stat(_manifest_path(key)).st_mtime_ns == index.mtime_ns:
+                return index
+        except FileNotFoundError:
+            pass
+        indexes.pop(key)
+
+    index = _load(key)
+    if index is None:
+        schedule_build(key)
+        return None
+    indexes.set(key, index)
+    return index
+
+
+def _run_build(course_id: str) -> None:
+    try:
+        with _build_lock(course_id):
+            _build(course_id)
+    except Exception:
+        # The course stays on pgvector; the next query queues another attempt
+        logger.exception("Building the local vector index for course %s failed", course_id)
+    finally:
+        with _locks_lock:
+            _pending.discard(course_id)
+
+
+def schedule_build(course_id: UUID | str) -> None:
+    """Queue a background build of the course's index unless one is already queued."""
+    key = str(course_id)
+    with _locks_lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    _get_builder().submit(_run_build, key)
+
+
+def invalidate_course_index(course_id: UUID | str) -> None:
+    """Drop the course's index (memory and files); call when its chunks change."""
+    key = str(course_id)
+    _generations[key] = _generations.get(key, 0) + 1
+    _too_large.discard(key)
+    _get_indexes().pop(key)
+    for path in [_manifest_path(key), *_vector_files(key)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def rebuild_course_index(course_id: UUID | str) -> None:
+    """
+    Drop the course's index and, with local_index_enabled, queue a rebuild.
+    Call after the course's chunks change; queries use pgvector meanwhile.
+    """
+    invalidate_course_index(course_id)
+    if get_settings().local_index_enabled:
+        schedule_build(course_id)
+
+
+def vector_index_stats() -> dict:
+    return {**_get_indexes().stats(), "too_large": len(_too_large), "building": len(_pending)}
@@ -0,0 +1,89 @@
+"""
+Concurrent load benchmark for POST /api/chat.
+
+Run the API with a single worker so the numbers are per worker:
+
+    uvicorn app.main:app --workers 1 --port 8000
+
+then, from the backend folder:
+
+    python -m benchmarks.chat_load --token <student access token> \
+        --session-id <chat session uuid> --concurrency 16 --requests 64
+
+The script fires ``--requests`` chat messages with at most ``--concurrency``
+in flight and reports throughput and latency percentiles.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+DEFAULT_MESSAGES = [
+    "What is recursion?",
+    "Can you explain the base case of a recursive function?",
+    "How does binary search work?",
+    "What is the difference between a stack and a queue?",
+]
+
+
+async def _send_one(
+    client: httpx.AsyncClient,
+    url: str,
+    session_id: str,
+    message: str,
+    semaphore: asyncio.Semaphore,
+) -> tuple[float, int]:
+    async with semaphore:
+        started = time.perf_counter()
+        r = await client.post(url, json={"session_id": session_id, "message": message})
+        return time.perf_counter() - started, r.status_code
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+async def run(args: argparse.Namespace) -> None:
+    url = f"{args.url.rstrip('/')}/api/chat"
+    semaphore = asyncio.Semaphore(args.concurrency)
+    headers = {"Authorization": f"Bearer {args.token}"}
+    async with httpx.AsyncClient(headers=headers, timeout=args.timeout) as client:
+        started = time.perf_counter()
+        results = await asyncio.gather(*[
+            _send_one(
+                client, url, args.session_id,
+                DEFAULT_MESSAGES[i % len(DEFAULT_MESSAGES)], semaphore,
+            )
+            for i in range(args.requests)
+        ])
+        elapsed = time.perf_counter() - started
+
+    latencies = [lat for lat, status in results if status == 200]
+    failures = len(results) - len(latencies)
+    print(f"requests:    {len(results)} (concurrency {args.concurrency})")
+    print(f"failures:    {failures}")
+    print(f"wall time:   {elapsed:.2f}s")
+    print(f"throughput:  {len(latencies) / elapsed:.2f} chats/s")
+    if latencies:
+        print(f"latency p50: {statistics.median(latencies):.2f}s")
+        print(f"latency p95: {_percentile(latencies, 95):.2f}s")
+        print(f"latency max: {max(latencies):.2f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True, help="Supabase access token of a student")
+    parser.add_argument("--session-id", required=True, help="Chat session owned by that student")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Latency and token cost of the multi-call and single-shot chat modes.
+
+Runs each message through both paths with the configured chat model
+(OPENAI_API_KEY env) and reports request-path latency and tokens per message:
+
+- multi_call: run_hint_controller, then run_student_assistant; plus
+  extract_topic, which chat() runs as a background task, so it counts
+  toward tokens but not latency. With the pre-controller on (the default)
+  the controller call is often skipped; --no-pre-controller forces it.
+- single_shot: one run_single_shot completion.
+
+Excerpts come from retrieval for --course-id (SUPABASE_* env) or a built-in
+sample. Prices are USD per million tokens (defaults: gpt-4o-mini).
+
+    python -m benchmarks.chat_modes --repeats 3
+    python -m benchmarks.chat_modes --course-id <uuid> --no-pre-controller
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from uuid import UUID
+
+from app.config import get_settings
+from app.models import Excerpt, Guardrails, HintControllerInput, HintState
+from app.services import llm
+from app.services.embeddings import get_async_openai_client
+
+MESSAGES = [
+    "What is the base case of a recursive function?",
+    "Can you give me an example of how a stack is used?",
+    "Just tell me the answer to problem 3, I need to find the depth of the tree.",
+    "Why does binary search need a sorted array?",
+]
+SAMPLE_EXCERPTS = [
+    Excerpt(
+        filename="lecture04_recursion.pdf",
+        chunk_index=3,
+        content=(
+            "A recursive function solves a problem by calling itself on a smaller instance. "
+            "Every recursive function needs a base case, an input it answers directly without "
+            "recursing, or the calls never terminate. The recursive case must move toward the "
+            "base case, e.g. by decreasing n. The depth of a binary tree is 0 for an empty tree "
+            "and otherwise 1 plus the larger depth of its two subtrees."
+        ),
+        similarity=0.62,
+    ),
+    Excerpt(
+        filename="lecture06_stacks_queues.pdf",
+        chunk_index=1,
+        content=(
+            "A stack is a last-in, first-out collection with push and pop. Function calls use "
+            "a call stack: each call pushes a frame and returning pops it. Stacks also check "
+            "balanced parentheses and evaluate postfix expressions. Binary search halves a "
+            "sorted range each step, comparing the target with the middle element; without "
+            "sorting, discarding half the range could discard the target."
+        ),
+        similarity=0.55,
+    ),
+]
+
+
+class _UsageRecorder:
+    """Stands in for the async OpenAI client and totals token usage per completion."""
+
+    def __init__(self, client):
+        self._create = client.chat.completions.create
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls = 0
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs):
+        response = await self._create(**kwargs)
+        self.calls += 1
+        self.prompt_tokens += response.usage.prompt_tokens
+        self.completion_tokens += response.usage.completion_tokens
+        return response
+
+
+async def _multi_call(controller_input: HintControllerInput, excerpts: list[Excerpt]) -> None:
+    output = await llm.run_hint_controller(controller_input)
+    if output.action != "refuse_out_of_scope":
+        await llm.run_student_assistant(
+            controller_input.student_message, excerpts, controller_input.guardrails,
+            output.hint_level, output.notes_for_assistant, output.action,
+        )
+
+
+async def _single_shot(controller_input: HintControllerInput, excerpts: list[Excerpt]) -> None:
+    await llm.run_single_shot(controller_input, excerpts)
+
+
+async def run(args: argparse.Namespace) -> None:
+    settings = get_settings()
+    settings.hint_pre_controller = not args.no_pre_controller
+    client = get_async_openai_client()
+    guardrails = Guardrails()
+
+    excerpts_by_message = {}
+    for message in MESSAGES:
+        if args.course_id:
+            from app.services.retrieval import retrieve_chunks
+
+            excerpts_by_message[message] = await retrieve_chunks(UUID(args.course_id), message)
+        else:
+            excerpts_by_message[message] = SAMPLE_EXCERPTS
+
+    print(f"{settings.chat_model}, {len(MESSAGES)} messages x {args.repeats}, "
+          f"pre-controller {'on' if settings.hint_pre_controller else 'off'}")
+    print(f"{'mode':12s}  {'calls':>5s}  {'p50 s':>6s}  {'mean s':>6s}  {'in tok':>7s}  {'out tok':>7s}  {'$/1k msgs':>9s}")
+    for mode, path in (("multi_call", _multi_call), ("single_shot", _single_shot)):
+        recorder = _UsageRecorder(client)
+        llm.get_async_openai_client = lambda: recorder
+        latencies = []
+        for _ in range(args.repeats):
+            for i, message in enumerate(MESSAGES):
+                controller_input = HintControllerInput(
+                    student_message=message,
+                    guardrails=guardrails,
+                    hint_state=HintState(hint_level_used=min(i, 2), number_of_hints_given=i),
+                    excerpt_hit_count=len(excerpts_by_message[message]),
+                )
+                started = time.perf_counter()
+                await path(controller_input, excerpts_by_message[message])
+                latencies.append(time.perf_counter() - started)
+                if mode == "multi_call":
+                    await llm.extract_topic(message, excerpts_by_message[message])
+        count = len(latencies)
+        prompt, completion = recorder.prompt_tokens / count, recorder.completion_tokens / count
+        cost = (prompt * args.input_price + completion * args.output_price) / 1e6 * 1000
+        print(
+            f"{mode:12s}  {recorder.calls / count:5.2f}  {statistics.median(latencies):6.2f}  "
+            f"{statistics.mean(latencies):6.2f}  {prompt:7.0f}  {completion:7.0f}  {cost:9.3f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--course-id", help="retrieve excerpts from this course instead of the sample")
+    parser.add_argument("--no-pre-controller", action="store_true", help="always call the LLM hint controller")
+    parser.add_argument("--input-price", type=float, default=0.15)
+    parser.add_argument("--output-price", type=float, default=0.60)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
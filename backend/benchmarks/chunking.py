@@ -0,0 +1,142 @@
+"""
+Legacy vs single-pass ``chunk_text``.
+
+The legacy chunker below is the previous implementation, kept verbatim
+(tokenizer looked up and text re-encoded for every paragraph, sentence and
+overlap). Both run over the same textbook-sized document; the report shows
+wall time, speedup and how many chunks differ, since counting tokens from
+document offsets can move a boundary by a token or two.
+
+    python -m benchmarks.chunking --chapters 40
+    python -m benchmarks.chunking --file textbook.txt
+"""
+import argparse
+import random
+import re
+import time
+
+import tiktoken
+
+from app.config import get_settings
+from app.services.chunking import chunk_text, get_encoding
+
+WORDS = (
+    "recursion induction invariant proof lemma theorem graph vertex edge "
+    "matrix vector eigenvalue entropy gradient descent convergence bound "
+    "algorithm complexity hash table pointer stack queue heap tree"
+).split()
+
+
+def legacy_count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+
+    return len(encoding.encode(text))
+
+
+def legacy_split_into_sentences(text: str) -> list[str]:
+    sentences = re.split(r'(?<=[.!?])\s+', text)
+    return [s.strip() for s in sentences if s.strip()]
+
+
+def legacy_chunk_text(text: str) -> list[str]:
+    settings = get_settings()
+    target_size = settings.chunk_size
+
+    text = text.strip()
+    text = "\n".join(line.strip() for line in text.split("\n"))
+
+    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
+
+    chunks = []
+    current_chunk = []
+    current_tokens = 0
+
+    for para in paragraphs:
+        para_tokens = legacy_count_tokens(para)
+
+        if para_tokens > target_size * 1.5:
+            if current_chunk:
+                chunks.append("\n\n".join(current_chunk))
+                current_chunk = []
+                current_tokens = 0
+
+            sentences = legacy_split_into_sentences(para)
+            for sentence in sentences:
+                sent_tokens = legacy_count_tokens(sentence)
+
+                if current_tokens + sent_tokens > target_size and current_chunk:
+                    chunks.append(" ".join(current_chunk))
+                    overlap_text = " ".join(current_chunk[-2:]) if len(current_chunk) >= 2 else ""
+                    current_chunk = [overlap_text] if overlap_text else []
+                    current_tokens = legacy_count_tokens(overlap_text) if overlap_text else 0
+
+                current_chunk.append(sentence)
+                current_tokens += sent_tokens
+        else:
+            if current_tokens + para_tokens > target_size and current_chunk:
+                chunks.append("\n\n".join(current_chunk))
+                current_chunk = []
+                current_tokens = 0
+
+            current_chunk.append(para)
+            current_tokens += para_tokens
+
+    if current_chunk:
+        chunks.append("\n\n".join(current_chunk))
+
+    return [c.strip() for c in chunks if c.strip()]
+
+
+def synthetic_textbook(chapters: int, seed: int = 0) -> str:
+    """Chapters of short paragraphs plus the occasional wall-of-text paragraph, like extracted PDFs."""
+    rng = random.Random(seed)
+
+    def sentence() -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 24))).capitalize() + "."
+
+    parts = []
+    for c in range(chapters):
+        parts.append(f"Chapter {c + 1}")
+        for _ in range(60):
+            count = rng.randint(60, 120) if rng.random() < 0.1 else rng.randint(2, 6)
+            parts.append(" ".join(sentence() for _ in range(count)))
+    return "\n\n".join(parts)
+
+
+def _time(fn, text: str, repeat: int) -> tuple[float, list[str]]:
+    best, chunks = float("inf"), []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunks = fn(text)
+        best = min(best, time.perf_counter() - started)
+    return best, chunks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chapters", type=int, default=40)
+    parser.add_argument("--file", help="plain-text document to chunk instead of the synthetic one")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = synthetic_textbook(args.chapters)
+    get_encoding()  # load the BPE ranks outside the timed runs
+    print(f"{len(text) / 1e6:.1f} MB of text, chunk_size={get_settings().chunk_size}")
+
+    legacy_s, legacy_chunks = _time(legacy_chunk_text, text, args.repeat)
+    new_s, new_chunks = _time(chunk_text, text, args.repeat)
+    differing = sum(a != b for a, b in zip(legacy_chunks, new_chunks)) + abs(len(legacy_chunks) - len(new_chunks))
+    print(f"legacy:      {legacy_s:7.3f}s  {len(legacy_chunks)} chunks")
+    print(f"single-pass: {new_s:7.3f}s  {len(new_chunks)} chunks  ({legacy_s / new_s:.1f}x)")
+    print(f"chunks differing: {differing}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Retrieval quality of shortened and quantized embeddings.
+
+For each output size (text-embedding-3 vectors truncated and
+renormalized, as the API's ``dimensions`` does) and storage precision
+(float32; float16 as in halfvec; int8 as in the local index), every
+query's top-k is compared with the full-size float32 top-k:
+
+- recall@k: overlap with the baseline top-k
+- bytes/vec: storage per vector
+
+Queries are held-out chunks (their own row excluded), so no API calls
+are made. Use real vectors: a course's chunks (--course-id, SUPABASE_*
+env) or a saved float32 matrix (--embeddings file.npy). Without either,
+a synthetic corpus whose variance decays across dimensions stands in;
+its numbers only exercise the pipeline.
+
+    python -m benchmarks.embedding_quality --course-id <uuid> --dims 1536 1024 512 256
+"""
+import argparse
+import json
+
+import numpy as np
+
+from app.services.vector_index import _fetch_chunks, quantize_int8
+
+PRECISIONS = {"float32": 4, "float16": 2, "int8": 1}
+
+
+def shorten(vectors: np.ndarray, dims: int) -> np.ndarray:
+    """First ``dims`` components, renormalized to unit length."""
+    short = np.ascontiguousarray(vectors[:, :dims], dtype=np.float32)
+    return short / np.linalg.norm(short, axis=1, keepdims=True)
+
+
+def store(vectors: np.ndarray, precision: str) -> np.ndarray:
+    """The vectors as read back from the given storage precision."""
+    if precision == "float16":
+        return vectors.astype(np.float16).astype(np.float32)
+    if precision == "int8":
+        quantized, scales = quantize_int8(vectors)
+        return quantized.astype(np.float32) * scales[:, np.newaxis]
+    return vectors
+
+
+def top_k(corpus: np.ndarray, queries: np.ndarray, query_rows: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    scores[np.arange(len(query_rows)), query_rows] = -np.inf  # a chunk isn't its own neighbour
+    return np.argpartition(-scores, k, axis=1)[:, :k]
+
+
+def load_vectors(args: argparse.Namespace) -> tuple[np.ndarray, str]:
+    if args.course_id:
+        chunks = _fetch_chunks(args.course_id) or []
+        rows = [json.loads(c["embedding"]) for c in chunks if c.get("embedding")]
+        return np.array(rows, dtype=np.float32), f"course {args.course_id}"
+    if args.embeddings:
+        return np.load(args.embeddings).astype(np.float32), args.embeddings
+    rng = np.random.default_rng(0)
+    decay = 1 / np.sqrt(1 + np.arange(1536) / 64)
+    topics = rng.standard_normal((40, 1536)) * decay
+    vectors = topics[rng.integers(0, 40, 5000)] + 0.8 * rng.standard_normal((5000, 1536)) * decay
+    return vectors.astype(np.float32), "synthetic"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--course-id")
+    parser.add_argument("--embeddings", help=".npy matrix of full-size embeddings")
+    parser.add_argument("--dims", type=int, nargs="+", default=[1536, 1024, 512, 256])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    vectors, source = load_vectors(args)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    rng = np.random.default_rng(1)
+    query_rows = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    baseline = top_k(vectors, vectors[query_rows], query_rows, args.k)
+    baseline_sets = [set(row) for row in baseline.tolist()]
+
+    print(f"{source}: {len(vectors)} vectors x {vectors.shape[1]} dims, {len(query_rows)} queries, k={args.k}")
+    print(f"{'dims':>5s}  {'precision':9s}  {'recall@k':>8s}  {'bytes/vec':>9s}")
+    for dims in args.dims:
+        short = shorten(vectors, min(dims, vectors.shape[1]))
+        queries = short[query_rows]
+        for precision, width in PRECISIONS.items():
+            found = top_k(store(short, precision), queries, query_rows, args.k)
+            recall = np.mean([len(baseline_sets[i] & set(row)) / args.k for i, row in enumerate(found.tolist())])
+            print(f"{short.shape[1]:5d}  {precision:9s}  {recall:8.3f}  {short.shape[1] * width:9d}")
+
+
+if __name__ == "__main__":
+    main()
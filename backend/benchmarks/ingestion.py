@@ -0,0 +1,78 @@
+"""
+Sequential vs pipelined ingestion, with stubbed services.
+
+Runs ``ingest_stream`` over a synthetic document twice: with the stages
+chained in one thread (the old extract-all, chunk-all, embed-all,
+insert-all behaviour, where stage times add up) and with the threaded,
+queue-connected pipeline. Page extraction, the embedding service and chunk
+inserts are simulated with sleeps, so the numbers show the overlap rather
+than network noise; chunking is the real chunker.
+
+    python -m benchmarks.ingestion --pages 200 --extract-ms 15 --embed-ms 250 --insert-ms 60
+"""
+import argparse
+import time
+
+from app.config import get_settings
+from app.services.chunking import ChunkSpan
+from app.services.ingestion_pipeline import ingest_stream
+from benchmarks.chunking import synthetic_textbook
+
+
+def _pages(text: str, count: int, extract_s: float):
+    size = max(1, len(text) // count)
+    for start in range(0, len(text), size):
+        time.sleep(extract_s)
+        yield text[start:start + size]
+
+
+def _plan(first: int, spans: list[ChunkSpan]) -> list[dict]:
+    return [{"chunk_index": i, "content": s.content} for i, s in enumerate(spans, start=first)]
+
+
+def _run(text: str, args: argparse.Namespace, threaded: bool) -> tuple[float, dict]:
+    settings = get_settings()
+    embed_s, insert_s = args.embed_ms / 1000, args.insert_ms / 1000
+
+    def embed(records: list[dict]) -> None:
+        time.sleep(embed_s)
+        for record in records:
+            record["embedding"] = [0.0]
+
+    def write(records: list[dict]) -> None:
+        time.sleep(insert_s)
+
+    started = time.perf_counter()
+    stats = ingest_stream(
+        _pages(text, args.pages, args.extract_ms / 1000),
+        plan=_plan,
+        embed=embed,
+        write=write,
+        batch_size=args.batch_size,
+        embed_concurrency=settings.embedding_concurrency if threaded else 1,
+        queue_size=settings.ingestion_queue_size,
+        window_pages=settings.ingestion_window_pages,
+        threaded=threaded,
+    )
+    return time.perf_counter() - started, stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--chapters", type=int, default=10, help="size of the synthetic document")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--extract-ms", type=float, default=15.0, help="per page")
+    parser.add_argument("--embed-ms", type=float, default=250.0, help="per embedding batch")
+    parser.add_argument("--insert-ms", type=float, default=60.0, help="per insert batch")
+    args = parser.parse_args()
+
+    text = synthetic_textbook(args.chapters)
+    for label, threaded in (("sequential", False), ("pipelined", True)):
+        elapsed, stats = _run(text, args, threaded)
+        stages = "  ".join(f"{name} {s.busy_seconds:5.2f}s/{s.items}" for name, s in stats.items())
+        print(f"{label:10s} {elapsed:6.2f}s   busy/items: {stages}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+In-process NumPy top-k vs the match_chunks RPC.
+
+Times ``CourseIndex.search`` (one matrix-vector product over a
+memory-mapped float32 matrix) for synthetic courses of each size, and,
+with --course-id, the match_chunks RPC for a real course on the
+configured Supabase project (SUPABASE_* env) with the same k.
+
+    python -m benchmarks.local_index --chunks 1000 5000 20000 50000
+    python -m benchmarks.local_index --course-id <uuid>
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.config import get_settings
+from app.services.vector_index import CourseIndex
+
+
+def _percentiles(latencies: list[float]) -> tuple[float, float]:
+    latencies = sorted(latencies)
+    return latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.95)] * 1000
+
+
+def time_local(chunks: int, dims: int, k: int, queries: int, directory: str) -> tuple[float, float, float]:
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((chunks, dims), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    path = os.path.join(directory, f"bench_{chunks}.npy")
+    np.save(path, vectors)
+    index = CourseIndex(np.load(path, mmap_mode="r"), [{"chunk_index": i} for i in range(chunks)], 0)
+    latencies = []
+    for q in rng.standard_normal((queries, dims), dtype=np.float32):
+        started = time.perf_counter()
+        index.search(q.tolist(), k)
+        latencies.append(time.perf_counter() - started)
+    return (*_percentiles(latencies), os.path.getsize(path) / 1e6)
+
+
+async def time_rpc(course_id: str, dims: int, k: int, queries: int) -> tuple[float, float]:
+    from app.db import get_async_supabase
+
+    settings = get_settings()
+    supabase = await get_async_supabase()
+    rng = np.random.default_rng(0)
+    latencies = []
+    for q in rng.standard_normal((queries, dims)):
+        started = time.perf_counter()
+        await supabase.rpc("match_chunks", {
+            "query_embedding": (q / np.linalg.norm(q)).tolist(),
+            "match_course_id": course_id,
+            "match_count": k,
+            "match_ef_search": settings.retrieval_hnsw_ef_search,
+            "match_probes": settings.retrieval_ivfflat_probes,
+        }).execute()
+        latencies.append(time.perf_counter() - started)
+    return _percentiles(latencies)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1000, 5000, 20000, 50000])
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--course-id", help="also time match_chunks for this course")
+    args = parser.parse_args()
+
+    print(f"{'backend':22s}  {'p50 ms':>7s}  {'p95 ms':>7s}  {'file MB':>7s}")
+    with tempfile.TemporaryDirectory() as directory:
+        for chunks in args.chunks:
+            p50, p95, size = time_local(chunks, args.dims, args.k, args.queries, directory)
+            print(f"{f'local, {chunks} chunks':22s}  {p50:7.2f}  {p95:7.2f}  {size:7.1f}")
+    if args.course_id:
+        p50, p95 = asyncio.run(time_rpc(args.course_id, args.dims, args.k, args.queries))
+        print(f"{'match_chunks RPC':22s}  {p50:7.2f}  {p95:7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Serial vs process-pool PDF text extraction.
+
+Builds a synthetic multi-hundred-page text PDF and times
+``extract_pdf_pages`` with one worker (the old serial path) and with
+each requested worker count, checking that the page texts match.
+
+    python -m benchmarks.pdf_extract --pages 400 --workers 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app.services.chunking import extract_pdf_pages
+
+LINES_PER_PAGE = 45
+WORDS = (
+    "recursion induction invariant proof lemma theorem graph vertex edge "
+    "matrix vector eigenvalue entropy gradient descent convergence bound"
+).split()
+
+
+def _page_stream(page_no: int) -> bytes:
+    lines = ["BT", "/F1 10 Tf", "12 TL", "50 780 Td"]
+    for i in range(LINES_PER_PAGE):
+        words = " ".join(WORDS[(page_no + i + j) % len(WORDS)] for j in range(12))
+        lines.append(f"(Page {page_no} line {i}: {words}) Tj T*")
+    lines.append("ET")
+    return "\n".join(lines).encode("latin-1")
+
+
+def write_synthetic_pdf(path: str, pages: int) -> None:
+    """Write a minimal, valid PDF with ``pages`` pages of Helvetica text."""
+    objects: list[bytes] = []
+    page_ids = [4 + 2 * i for i in range(pages)]
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i in range(pages):
+        stream = _page_stream(i + 1)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_ids[i] + 1} 0 R >>".encode()
+        )
+        objects.append(
+            f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream"
+        )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{num} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def _time(path: str, workers: int) -> tuple[float, list[str]]:
+    started = time.perf_counter()
+    pages = extract_pdf_pages(path, workers=workers)
+    return time.perf_counter() - started, pages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, os.cpu_count() or 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.pdf")
+        write_synthetic_pdf(path, args.pages)
+        print(f"{args.pages} pages, {os.path.getsize(path) / 1e6:.1f} MB, {os.cpu_count()} CPUs")
+
+        serial_s, serial_pages = _time(path, 1)
+        print(f"serial:     {serial_s:6.2f}s")
+        for workers in sorted(set(args.workers)):
+            # First call pays for spawning the pool; time the warm run
+            _time(path, workers)
+            elapsed, pages = _time(path, workers)
+            assert pages == serial_pages, "parallel extraction changed the output"
+            print(f"{workers:2d} workers: {elapsed:6.2f}s  ({serial_s / elapsed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Retrieval quality of the vector and hybrid modes on a labeled query set.
+
+The query set is JSONL, one query per line, naming the chunks that answer it:
+
+    {"course_id": "<uuid>", "query": "State Theorem 3.2", "relevant": [{"filename": "ch3.pdf", "chunk_index": 12}]}
+
+Each query is run through ``retrieve_chunks`` in every mode against the
+configured Supabase project (SUPABASE_* and OPENAI_API_KEY env), and hit
+rate, recall@k and MRR are reported with RPC latency. Query embeddings are
+computed once up front, so the latencies compare the RPCs alone.
+
+    python -m benchmarks.retrieval_eval queries.jsonl --modes vector hybrid
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from uuid import UUID
+
+from app.config import get_settings
+from app.services.embeddings import embed_text
+from app.services.retrieval import retrieve_chunks
+
+
+def load_queries(path: str) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def evaluate(queries: list[dict], mode: str) -> dict:
+    hits, recalls, reciprocal_ranks, latencies = [], [], [], []
+    for q in queries:
+        relevant = {(r["filename"], r["chunk_index"]) for r in q["relevant"]}
+        started = time.perf_counter()
+        excerpts = await retrieve_chunks(UUID(q["course_id"]), q["query"], mode=mode)
+        latencies.append(time.perf_counter() - started)
+        found = [(e.filename, e.chunk_index) in relevant for e in excerpts]
+        hits.append(any(found))
+        recalls.append(sum(found) / len(relevant) if relevant else 0.0)
+        reciprocal_ranks.append(1 / (found.index(True) + 1) if any(found) else 0.0)
+    latencies.sort()
+    return {
+        "hit_rate": statistics.mean(hits),
+        "recall": statistics.mean(recalls),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+    queries = load_queries(args.queries)
+    for q in queries:
+        await embed_text(q["query"])
+    k = get_settings().retrieval_top_k
+    print(f"{len(queries)} queries, top {k}")
+    print(f"{'mode':8s}  {'hit@k':>6s}  {'recall@k':>8s}  {'MRR':>6s}  {'p50 ms':>7s}  {'p95 ms':>7s}")
+    for mode in args.modes:
+        r = await evaluate(queries, mode)
+        print(
+            f"{mode:8s}  {r['hit_rate']:6.3f}  {r['recall']:8.3f}  {r['mrr']:6.3f}  "
+            f"{r['p50_ms']:7.1f}  {r['p95_ms']:7.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("queries", help="labeled JSONL query set")
+    parser.add_argument("--modes", nargs="+", choices=["vector", "hybrid"], default=["vector", "hybrid"])
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Backfill chunk embeddings after changing the embedding model or size.
+
+--dimensions N
+    Shrink the stored text-embedding-3 vectors in place to N dimensions:
+    the first N components, renormalized, which is what the API returns
+    for dimensions=N, so nothing is re-embedded. chunks.embedding becomes
+    halfvec(N) and the HNSW index is rebuilt. Needs a direct Postgres
+    connection (DATABASE_URL or --database-url, and psycopg) and
+    EMBEDDING_DIMENSIONS=N in the environment. Apply migration 011 first.
+
+Then, and by default, every chunk whose embedding_model isn't the
+configured model and size (e.g. "text-embedding-3-small@512") is
+re-embedded through the API and written back through PostgREST, a
+page at a time. Run it again after an interruption; it picks up where
+it stopped.
+
+    python -m tools.backfill_embeddings --dimensions 512
+    python -m tools.backfill_embeddings --dry-run
+"""
+import argparse
+import time
+
+from postgrest.types import ReturnMethod
+
+from app.config import get_settings
+from app.db import get_supabase
+from app.services.chunk_writer import COPY_COLUMNS, format_vector
+from app.services.embeddings import embed_texts, embedding_model_id
+from app.services.vector_index import invalidate_course_index
+
+ROW_COLUMNS = tuple(c for c in COPY_COLUMNS if c != "embedding")
+
+
+def shrink_dimensions(dimensions: int, database_url: str) -> int:
+    """Truncate and renormalize every stored vector to ``dimensions``; returns the rows relabelled."""
+    import psycopg
+
+    with psycopg.connect(database_url) as conn:
+        conn.execute("set statement_timeout = 0")
+        current = conn.execute(
+            "select vector_dims(embedding) from chunks where embedding is not null limit 1"
+        ).fetchone()
+        if current and current[0] < dimensions:
+            raise SystemExit(f"Stored vectors have {current[0]} dimensions; re-embed to grow them")
+        # Only text-embedding-3 vectors keep their meaning when truncated; rows
+        # of other models keep their label and are re-embedded afterwards
+        relabelled = conn.execute(
+            "update chunks set embedding_model = split_part(embedding_model, '@', 1) || '@' || %s"
+            " where embedding_model like 'text-embedding-3-%%'",
+            (str(dimensions),),
+        ).rowcount
+        conn.execute("drop index if exists idx_chunks_embedding_hnsw")
+        conn.execute(
+            f"alter table chunks alter column embedding type halfvec({dimensions})"
+            f" using l2_normalize(subvector(embedding::halfvec, 1, {dimensions}))::halfvec({dimensions})"
+        )
+        conn.execute(
+            "create index idx_chunks_embedding_hnsw on chunks"
+            " using hnsw (embedding halfvec_cosine_ops) with (m = 16, ef_construction = 64)"
+        )
+        courses = [row[0] for row in conn.execute("select id from courses").fetchall()]
+    for course_id in courses:
+        invalidate_course_index(course_id)
+    return relabelled
+
+
+def _stale_rows(target: str, limit: int) -> list[dict]:
+    return (
+        get_supabase().table("chunks").select(", ".join(ROW_COLUMNS))
+        .or_(f'embedding_model.is.null,embedding_model.neq."{target}"')
+        .order("id").limit(limit).execute()
+    ).data or []
+
+
+def reembed(batch_size: int, dry_run: bool = False) -> int:
+    """Re-embed chunks labelled with another model or size; returns how many were written."""
+    supabase = get_supabase()
+    target = embedding_model_id()
+    done = 0
+    while rows := _stale_rows(target, batch_size):
+        if dry_run:
+            print(f"{len(rows)}{'+' if len(rows) == batch_size else ''} chunks would be re-embedded as {target}")
+            return 0
+        started = time.perf_counter()
+        vectors = embed_texts([r["content"] for r in rows])
+        supabase.table("chunks").upsert(
+            [{**r, "embedding_model": target, "embedding": format_vector(v)} for r, v in zip(rows, vectors)],
+            returning=ReturnMethod.minimal,
+        ).execute()
+        for course_id in {r["course_id"] for r in rows}:
+            invalidate_course_index(course_id)
+        done += len(rows)
+        print(f"re-embedded {done} chunks ({len(rows) / (time.perf_counter() - started):.0f}/s)")
+    return done
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dimensions", type=int, help="shrink stored text-embedding-3 vectors to this size")
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--dry-run", action="store_true", help="only report whether chunks need re-embedding")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    if args.dimensions and not args.dry_run:
+        if settings.embedding_dimensions != args.dimensions:
+            parser.error(f"set EMBEDDING_DIMENSIONS={args.dimensions} so new chunks and queries match")
+        database_url = args.database_url or settings.database_url
+        if not database_url:
+            parser.error("--dimensions needs --database-url or DATABASE_URL")
+        print(f"relabelled {shrink_dimensions(args.dimensions, database_url)} chunks; column is halfvec({args.dimensions})")
+    reembed(args.batch_size, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
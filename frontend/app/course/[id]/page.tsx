@@ -4,7 +4,7 @@ import { useEffect, useState, useCallback } from "react";
 import { useParams, useRouter } from "next/navigation";
 import { ChatWindow } from "@/components/ChatWindow";
 import { SourcesPanel } from "@/components/SourcesPanel";
-import { getCourse, createSession, getSessionMessages, sendMessage, Course, ChatMessage, ChatResponse } from "@/lib/api";
+import { getCourse, createSession, getSessionMessages, sendMessageStream, Course, ChatMessage, ChatResponse } from "@/lib/api";
 import { createClient } from "@/lib/supabase/client";
 import { ArrowLeft, LogOut, Loader2, FileQuestion, Layers, Headphones, BarChart3, Presentation, Video, ChevronLeft, ChevronRight } from "lucide-react";
 import { Button } from "@/components/ui/button";
@@ -97,15 +97,36 @@ export default function StudentChatPage() {
     };
     setMessages(prev => [...prev, tempUserMessage]);
     
+    const streamingId = `stream-${Date.now()}`;
     try {
-      const response: ChatResponse = await sendMessage({
-        session_id: sessionId,
-        message: content,
-        request_hint_increase: requestHintIncrease,
-      });
+      const response: ChatResponse = await sendMessageStream(
+        {
+          session_id: sessionId,
+          message: content,
+          request_hint_increase: requestHintIncrease,
+        },
+        {
+          onMeta: (meta) => {
+            setMessages(prev => [...prev, {
+              id: streamingId,
+              session_id: sessionId,
+              role: "assistant",
+              content: "",
+              hint_level: meta.hint_level,
+              created_at: new Date().toISOString(),
+              sources: meta.sources,
+            }]);
+          },
+          onToken: (delta) => {
+            setMessages(prev => prev.map(m =>
+              m.id === streamingId ? { ...m, content: m.content + delta } : m
+            ));
+          },
+        }
+      );
       
       setMessages(prev => {
-        const filtered = prev.filter(m => m.id !== tempUserMessage.id);
+        const filtered = prev.filter(m => m.id !== tempUserMessage.id && m.id !== streamingId);
         return [...filtered, 
           { ...tempUserMessage, id: `user-${Date.now()}` },
           response.message
@@ -114,7 +135,7 @@ export default function StudentChatPage() {
       
       setCurrentHintLevel(response.hint_level);
     } catch (err) {
-      setMessages(prev => prev.filter(m => m.id !== tempUserMessage.id));
+      setMessages(prev => prev.filter(m => m.id !== tempUserMessage.id && m.id !== streamingId));
       setError("Failed to send message. Please try again.");
       console.error(err);
     } finally {
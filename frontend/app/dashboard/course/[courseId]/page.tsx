@@ -271,7 +271,8 @@ export default function TeacherDashboardPage() {
     setIsUploading(true);
     try {
       const result = await uploadFile(courseId, file);
-      toast({ title: "File uploaded!", description: `Created ${result.chunks_created} searchable chunks` });
+      const reused = result.chunks_reused ? ` (${result.chunks_reused} unchanged)` : "";
+      toast({ title: "File uploaded!", description: `Created ${result.chunks_created} searchable chunks${reused}` });
       const filesData = await getCourseFiles(courseId);
       setFiles(filesData);
     } catch (error) {
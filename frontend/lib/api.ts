@@ -96,7 +96,8 @@ export interface ChatRequest {
 export interface ChatResponse {
   message: ChatMessage;
   hint_level: number;
-  action: "answer" | "answer_with_integrity_refusal" | "refuse_out_of_scope";
+  action: "answer" | "answer_with_integrity_refusal" | "refuse_out_of_scope" | "redirected";
+  cached?: boolean;
 }
 
 export async function validateJoinCode(code: string): Promise<{ name: string } | null> {
@@ -180,7 +181,110 @@ export async function sendMessage(request: ChatRequest): Promise<ChatResponse> {
   return res.json();
 }
 
-export async function uploadFile(courseId: string, file: File): Promise<{ success: boolean; chunks_created: number }> {
+export interface ChatStreamMeta {
+  sources: Source[];
+  action: ChatResponse["action"];
+  hint_level: number;
+  cached: boolean;
+}
+
+export interface ChatStreamHandlers {
+  onMeta?: (meta: ChatStreamMeta) => void;
+  onToken?: (delta: string) => void;
+}
+
+/** POST /api/chat/stream: calls the handlers as SSE events arrive and resolves with the stored reply. */
+export async function sendMessageStream(
+  request: ChatRequest,
+  handlers: ChatStreamHandlers = {}
+): Promise<ChatResponse> {
+  const token = await getAccessToken();
+  const res = await fetch(`${API_URL}/api/chat/stream`, {
+    method: "POST",
+    headers: authJsonHeaders(token),
+    body: JSON.stringify(request),
+  });
+  if (!res.ok || !res.body) throw new Error("Failed to send message");
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let final: ChatResponse | null = null;
+
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let sep: number;
+    while ((sep = buffer.indexOf("\n\n")) >= 0) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let event = "message";
+      let data = "";
+      for (const line of raw.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      }
+      if (!data) continue;
+      const payload = JSON.parse(data);
+      if (event === "meta") handlers.onMeta?.(payload as ChatStreamMeta);
+      else if (event === "token") handlers.onToken?.((payload as { delta: string }).delta);
+      else if (event === "done") final = payload as ChatResponse;
+      else if (event === "error") throw new Error((payload as { detail?: string }).detail || "Failed to send message");
+    }
+  }
+
+  if (!final) throw new Error("Stream ended before the reply was stored");
+  return final;
+}
+
+export interface UploadJobStage {
+  status: "pending" | "running" | "succeeded" | "failed";
+  completed: number;
+  total: number | null;
+  attempts: number;
+}
+
+export interface EmbeddingBatch {
+  index: number;
+  inputs: number;
+  tokens: number;
+  attempts: number;
+  seconds: number;
+}
+
+export interface UploadJob {
+  id: string;
+  course_id: string;
+  filename: string;
+  status: "queued" | "running" | "succeeded" | "failed";
+  stages: Record<string, UploadJobStage>;
+  file_id: string | null;
+  chunks_created: number | null;
+  chunks_reused: number | null;
+  chunks_embedded: number | null;
+  chunks_deleted: number | null;
+  embedding_batches: EmbeddingBatch[];
+  error: string | null;
+  created_at: string;
+  updated_at: string;
+}
+
+export async function getUploadJob(jobId: string): Promise<UploadJob> {
+  const token = await getAccessToken();
+  const res = await fetch(`${API_URL}/api/upload/jobs/${jobId}`, {
+    headers: { Authorization: `Bearer ${token}` },
+  });
+  if (!res.ok) throw new Error(await parseApiError(res));
+  return res.json();
+}
+
+/** Queues the file for ingestion and resolves once the background job has finished. */
+export async function uploadFile(
+  courseId: string,
+  file: File,
+  onProgress?: (job: UploadJob) => void
+): Promise<{ success: boolean; chunks_created: number; chunks_reused: number; chunks_embedded: number }> {
   const token = await getAccessToken();
   const formData = new FormData();
   formData.append("file", file);
@@ -190,8 +294,20 @@ export async function uploadFile(courseId: string, file: File): Promise<{ succes
     headers: { Authorization: `Bearer ${token}` },
     body: formData,
   });
-  if (!res.ok) throw new Error("Failed to upload file");
-  return res.json();
+  if (!res.ok) throw new Error(await parseApiError(res));
+  let job = (await res.json()) as UploadJob;
+  while (job.status === "queued" || job.status === "running") {
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+    job = await getUploadJob(job.id);
+    onProgress?.(job);
+  }
+  if (job.status === "failed") throw new Error(job.error || "Failed to upload file");
+  return {
+    success: true,
+    chunks_created: job.chunks_created ?? 0,
+    chunks_reused: job.chunks_reused ?? 0,
+    chunks_embedded: job.chunks_embedded ?? 0,
+  };
 }
 
 export async function getGuardrails(courseId: string): Promise<Guardrails> {
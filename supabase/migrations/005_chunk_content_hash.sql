@@ -0,0 +1,28 @@
+-- =====================================================
+-- TA-I Chunk Content Hashes
+-- =====================================================
+-- Lets re-uploads reuse unchanged chunks and their embeddings
+-- instead of re-embedding the whole file.
+
+-- content_hash: hex SHA-256 of the chunk's UTF-8 text
+-- embedding_model: model that produced the stored vector
+alter table chunks
+  add column if not exists content_hash text,
+  add column if not exists embedding_model text;
+
+-- Backfill existing rows (all embedded with the original default model)
+update chunks
+  set content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex')
+  where content_hash is null;
+
+update chunks
+  set embedding_model = 'text-embedding-3-small'
+  where embedding_model is null;
+
+-- Embedding reuse looks chunks up by course, model and hash
+create index if not exists idx_chunks_course_model_hash
+  on chunks(course_id, embedding_model, content_hash);
+
+-- Re-uploads find the earlier file by name
+create index if not exists idx_course_files_course_filename
+  on course_files(course_id, filename);
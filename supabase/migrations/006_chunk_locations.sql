@@ -0,0 +1,14 @@
+-- =====================================================
+-- TA-I Chunk Locations
+-- =====================================================
+-- Where each chunk came from in its file, recorded by the
+-- "structured" chunking mode (null for paragraph-mode chunks).
+
+-- Page: 1-based PDF page the chunk starts on (null for text files)
+alter table chunks
+  add column if not exists page int;
+
+-- Character offsets of the chunk in the extracted document text
+alter table chunks
+  add column if not exists char_start int,
+  add column if not exists char_end int;
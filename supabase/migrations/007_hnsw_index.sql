@@ -0,0 +1,71 @@
+-- =====================================================
+-- TA-I HNSW Vector Index + Tunable Search
+-- =====================================================
+-- Replaces the ivfflat index (lists = 100, built once over every
+-- course) with HNSW, which needs no training data, keeps recall as
+-- the table grows, and can be tuned per query with ef_search.
+-- Requires pgvector >= 0.5.0.
+
+drop index if exists idx_chunks_embedding;
+
+create index if not exists idx_chunks_embedding_hnsw on chunks
+using hnsw (embedding vector_cosine_ops) with (m = 16, ef_construction = 64);
+
+-- To stay on ivfflat instead (e.g. pgvector < 0.5), skip the HNSW
+-- index above and rebuild ivfflat sized to the table, roughly
+-- lists = rows / 1000:
+--   create index idx_chunks_embedding on chunks
+--   using ivfflat (embedding vector_cosine_ops) with (lists = 100);
+
+-- =====================================================
+-- match_chunks with per-query ANN parameters
+-- =====================================================
+-- match_ef_search: HNSW candidate list size (pgvector default 40).
+--   The course filter is applied to the candidates, so it must be
+--   well above match_count when a course is a small share of the table.
+-- match_probes: ivfflat lists to scan (pgvector default 1).
+-- Null leaves the server setting alone. Both are set transaction-local.
+drop function if exists match_chunks(vector, uuid, int);
+
+create or replace function match_chunks(
+  query_embedding vector(1536),
+  match_course_id uuid,
+  match_count int default 5,
+  match_ef_search int default null,
+  match_probes int default null
+)
+returns table (
+  id uuid,
+  course_id uuid,
+  file_id uuid,
+  chunk_index int,
+  content text,
+  filename text,
+  similarity float
+)
+language plpgsql
+as $$
+begin
+  if match_ef_search is not null then
+    perform set_config('hnsw.ef_search', match_ef_search::text, true);
+  end if;
+  if match_probes is not null then
+    perform set_config('ivfflat.probes', match_probes::text, true);
+  end if;
+
+  return query
+  select
+    c.id,
+    c.course_id,
+    c.file_id,
+    c.chunk_index,
+    c.content,
+    cf.filename,
+    1 - (c.embedding <=> query_embedding) as similarity
+  from chunks c
+  join course_files cf on c.file_id = cf.id
+  where c.course_id = match_course_id
+  order by c.embedding <=> query_embedding
+  limit match_count;
+end;
+$$;
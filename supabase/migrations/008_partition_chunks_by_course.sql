@@ -0,0 +1,217 @@
+-- =====================================================
+-- TA-I Per-Course Chunk Partitions
+-- =====================================================
+-- chunks becomes a list-partitioned table with one partition per
+-- course. Each partition has its own HNSW index, so a course's
+-- similarity search only walks that course's vectors and its latency
+-- doesn't grow with the number of courses on the deployment.
+-- Rewrites the chunks table; run during a quiet period.
+
+alter table chunks rename to chunks_unpartitioned;
+-- The renamed table keeps its index and constraint names, which the new
+-- table reuses. The old indexes aren't needed for the copy below.
+alter table chunks_unpartitioned rename constraint chunks_pkey to chunks_unpartitioned_pkey;
+drop index if exists idx_chunks_course_id;
+drop index if exists idx_chunks_course_model_hash;
+drop index if exists idx_chunks_embedding_hnsw;
+drop index if exists idx_chunks_embedding;
+
+create table chunks (
+  id uuid not null default gen_random_uuid(),
+  course_id uuid not null references courses(id) on delete cascade,
+  file_id uuid references course_files(id) on delete cascade,
+  chunk_index int not null,
+  content text not null,
+  embedding vector(1536),
+  created_at timestamptz default now(),
+  content_hash text,
+  embedding_model text,
+  page int,
+  char_start int,
+  char_end int,
+  -- The partition key has to be part of the primary key
+  primary key (course_id, id)
+) partition by list (course_id);
+
+-- Rows for a course without a partition land here rather than failing
+create table chunks_default partition of chunks default;
+
+-- Partitions are tables PostgREST exposes in their own right, and the
+-- parent's policies only apply to queries through the parent. With RLS on
+-- and no policies of their own, API roles can't read them directly.
+alter table chunks enable row level security;
+alter table chunks_default enable row level security;
+
+-- Indexes on the parent are created on every partition
+create index idx_chunks_file_id on chunks(file_id);
+create index idx_chunks_course_model_hash on chunks(course_id, embedding_model, content_hash);
+create index idx_chunks_embedding_hnsw on chunks
+using hnsw (embedding vector_cosine_ops) with (m = 16, ef_construction = 64);
+
+-- =====================================================
+-- Partition management
+-- =====================================================
+create or replace function chunk_partition_name(p_course_id uuid)
+returns text
+language sql
+immutable
+as $$
+  select 'chunks_' || replace(p_course_id::text, '-', '');
+$$;
+
+-- security definer: the API role doesn't own chunks, and only the owner can attach partitions
+create or replace function ensure_chunk_partition(p_course_id uuid)
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+  execute format(
+    'create table if not exists %I partition of chunks for values in (%L)',
+    chunk_partition_name(p_course_id), p_course_id
+  );
+  execute format('alter table %I enable row level security', chunk_partition_name(p_course_id));
+end;
+$$;
+
+create or replace function create_course_chunk_partition()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+  perform ensure_chunk_partition(new.id);
+  return new;
+end;
+$$;
+
+drop trigger if exists trg_courses_chunk_partition on courses;
+create trigger trg_courses_chunk_partition
+  after insert on courses
+  for each row execute function create_course_chunk_partition();
+
+-- A deleted course's rows go with the cascade, but its (empty) partition
+-- stays: dropping it from the delete's own trigger conflicts with the
+-- cascade still using the table. Run this periodically to drop them.
+create or replace function prune_chunk_partitions()
+returns int
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  part record;
+  dropped int := 0;
+begin
+  for part in
+    select c.relname
+    from pg_inherits i
+    join pg_class c on c.oid = i.inhrelid
+    where i.inhparent = 'public.chunks'::regclass
+      and c.relname <> 'chunks_default'
+      and not exists (
+        select 1 from courses co where chunk_partition_name(co.id) = c.relname
+      )
+  loop
+    execute format('drop table if exists %I', part.relname);
+    dropped := dropped + 1;
+  end loop;
+  return dropped;
+end;
+$$;
+
+-- =====================================================
+-- Move existing rows into per-course partitions
+-- =====================================================
+select ensure_chunk_partition(id) from courses;
+
+insert into chunks (
+  id, course_id, file_id, chunk_index, content, embedding, created_at,
+  content_hash, embedding_model, page, char_start, char_end
+)
+select
+  id, course_id, file_id, chunk_index, content, embedding, created_at,
+  content_hash, embedding_model, page, char_start, char_end
+from chunks_unpartitioned
+where course_id is not null;
+
+drop table chunks_unpartitioned;
+
+-- The policies from 004_phase1_auth.sql went with the old table
+create policy "chunks_instructor_all" on chunks
+  for all to authenticated
+  using (
+    exists (
+      select 1 from courses c
+      where c.id = chunks.course_id
+        and c.instructor_id = auth.uid()
+    )
+  )
+  with check (
+    exists (
+      select 1 from courses c
+      where c.id = chunks.course_id
+        and c.instructor_id = auth.uid()
+    )
+  );
+
+create policy "chunks_student_select" on chunks
+  for select to authenticated
+  using (
+    exists (
+      select 1 from public.enrollments e
+      where e.course_id = chunks.course_id
+        and e.student_id = auth.uid()
+    )
+  );
+
+-- =====================================================
+-- match_chunks: filter on the partition key first
+-- =====================================================
+-- course_id = match_course_id prunes the scan to the course's own
+-- partition, so the HNSW candidates are all in the course and
+-- match_ef_search only needs to exceed match_count.
+create or replace function match_chunks(
+  query_embedding vector(1536),
+  match_course_id uuid,
+  match_count int default 5,
+  match_ef_search int default null,
+  match_probes int default null
+)
+returns table (
+  id uuid,
+  course_id uuid,
+  file_id uuid,
+  chunk_index int,
+  content text,
+  filename text,
+  similarity float
+)
+language plpgsql
+as $$
+begin
+  if match_ef_search is not null then
+    perform set_config('hnsw.ef_search', match_ef_search::text, true);
+  end if;
+  if match_probes is not null then
+    perform set_config('ivfflat.probes', match_probes::text, true);
+  end if;
+
+  return query
+  select
+    c.id,
+    c.course_id,
+    c.file_id,
+    c.chunk_index,
+    c.content,
+    cf.filename,
+    1 - (c.embedding <=> query_embedding) as similarity
+  from chunks c
+  join course_files cf on c.file_id = cf.id and cf.course_id = match_course_id
+  where c.course_id = match_course_id
+  order by c.embedding <=> query_embedding
+  limit match_count;
+end;
+$$;
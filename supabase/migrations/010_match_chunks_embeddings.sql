@@ -0,0 +1,144 @@
+-- =====================================================
+-- TA-I Candidate Embeddings for Re-ranking
+-- =====================================================
+-- match_chunks and match_chunks_hybrid can return each row's
+-- embedding, so the API can over-fetch candidates and re-rank them
+-- for diversity (MMR) without a second query. Off by default:
+-- a 1536-dim vector is ~19 KB of JSON per row.
+-- Adding a return column needs the functions dropped first.
+
+drop function if exists match_chunks(vector, uuid, int, int, int);
+drop function if exists match_chunks_hybrid(vector, text, uuid, int, int, int, int, int);
+
+create or replace function match_chunks(
+  query_embedding vector(1536),
+  match_course_id uuid,
+  match_count int default 5,
+  match_ef_search int default null,
+  match_probes int default null,
+  match_with_embeddings boolean default false
+)
+returns table (
+  id uuid,
+  course_id uuid,
+  file_id uuid,
+  chunk_index int,
+  content text,
+  filename text,
+  similarity float,
+  embedding vector(1536)
+)
+language plpgsql
+as $$
+begin
+  if match_ef_search is not null then
+    perform set_config('hnsw.ef_search', match_ef_search::text, true);
+  end if;
+  if match_probes is not null then
+    perform set_config('ivfflat.probes', match_probes::text, true);
+  end if;
+
+  return query
+  select
+    c.id,
+    c.course_id,
+    c.file_id,
+    c.chunk_index,
+    c.content,
+    cf.filename,
+    1 - (c.embedding <=> query_embedding) as similarity,
+    case when match_with_embeddings then c.embedding end
+  from chunks c
+  join course_files cf on c.file_id = cf.id and cf.course_id = match_course_id
+  where c.course_id = match_course_id
+  order by c.embedding <=> query_embedding
+  limit match_count;
+end;
+$$;
+
+create or replace function match_chunks_hybrid(
+  query_embedding vector(1536),
+  query_text text,
+  match_course_id uuid,
+  match_count int default 5,
+  match_candidates int default 40,
+  rrf_k int default 60,
+  match_ef_search int default null,
+  match_probes int default null,
+  match_with_embeddings boolean default false
+)
+returns table (
+  id uuid,
+  course_id uuid,
+  file_id uuid,
+  chunk_index int,
+  content text,
+  filename text,
+  similarity float,
+  vector_rank int,
+  lexical_rank int,
+  score float,
+  embedding vector(1536)
+)
+language plpgsql
+as $$
+#variable_conflict use_column
+declare
+  lexical_query tsquery;
+begin
+  if match_ef_search is not null then
+    perform set_config('hnsw.ef_search', match_ef_search::text, true);
+  end if;
+  if match_probes is not null then
+    perform set_config('ivfflat.probes', match_probes::text, true);
+  end if;
+
+  -- Null when every word is a stop word; the lexical list is then empty
+  lexical_query := nullif(
+    replace(plainto_tsquery('english', query_text)::text, '&', '|'), ''
+  )::tsquery;
+
+  return query
+  with vector_hits as (
+    select c.id, row_number() over (order by c.embedding <=> query_embedding) as rank
+    from chunks c
+    where c.course_id = match_course_id
+    order by c.embedding <=> query_embedding
+    limit match_candidates
+  ),
+  lexical_hits as (
+    select c.id, row_number() over (order by ts_rank_cd(c.content_tsv, lexical_query) desc) as rank
+    from chunks c
+    where c.course_id = match_course_id
+      and c.content_tsv @@ lexical_query
+    order by ts_rank_cd(c.content_tsv, lexical_query) desc
+    limit match_candidates
+  ),
+  fused as (
+    select
+      coalesce(v.id, l.id) as chunk_id,
+      v.rank as vector_rank,
+      l.rank as lexical_rank,
+      coalesce(1.0 / (rrf_k + v.rank), 0) + coalesce(1.0 / (rrf_k + l.rank), 0) as score
+    from vector_hits v
+    full outer join lexical_hits l on l.id = v.id
+  )
+  select
+    c.id,
+    c.course_id,
+    c.file_id,
+    c.chunk_index,
+    c.content,
+    cf.filename,
+    1 - (c.embedding <=> query_embedding) as similarity,
+    f.vector_rank::int,
+    f.lexical_rank::int,
+    f.score::float,
+    case when match_with_embeddings then c.embedding end
+  from fused f
+  join chunks c on c.id = f.chunk_id and c.course_id = match_course_id
+  join course_files cf on c.file_id = cf.id and cf.course_id = match_course_id
+  order by f.score desc, f.vector_rank nulls last
+  limit match_count;
+end;
+$$;
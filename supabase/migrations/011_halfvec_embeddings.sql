@@ -0,0 +1,161 @@
+-- =====================================================
+-- TA-I Half-Precision Embedding Storage
+-- =====================================================
+-- Stores chunks.embedding as halfvec (16-bit floats): half the table,
+-- index and per-query I/O of vector(1536), with cosine rankings that
+-- barely move. Requires pgvector >= 0.7.0. Rewrites the chunks table
+-- and rebuilds the HNSW index; run during a quiet period.
+--
+-- To go further with shortened text-embedding-3 vectors (e.g. 512
+-- dims), run `python -m tools.backfill_embeddings --dimensions 512`
+-- from backend/ and set EMBEDDING_DIMENSIONS=512. The RPCs below take
+-- a query vector of any size, so they need no change for that.
+
+drop index if exists idx_chunks_embedding_hnsw;
+
+alter table chunks
+  alter column embedding type halfvec(1536) using embedding::halfvec(1536);
+
+create index idx_chunks_embedding_hnsw on chunks
+using hnsw (embedding halfvec_cosine_ops) with (m = 16, ef_construction = 64);
+
+-- =====================================================
+-- match_chunks / match_chunks_hybrid on halfvec
+-- =====================================================
+-- The query stays a full-precision vector and is cast per comparison,
+-- which keeps the HNSW index usable. Returned embeddings are halfvec.
+drop function if exists match_chunks(vector, uuid, int, int, int, boolean);
+drop function if exists match_chunks_hybrid(vector, text, uuid, int, int, int, int, int, boolean);
+
+create or replace function match_chunks(
+  query_embedding vector,
+  match_course_id uuid,
+  match_count int default 5,
+  match_ef_search int default null,
+  match_probes int default null,
+  match_with_embeddings boolean default false
+)
+returns table (
+  id uuid,
+  course_id uuid,
+  file_id uuid,
+  chunk_index int,
+  content text,
+  filename text,
+  similarity float,
+  embedding halfvec
+)
+language plpgsql
+as $$
+begin
+  if match_ef_search is not null then
+    perform set_config('hnsw.ef_search', match_ef_search::text, true);
+  end if;
+  if match_probes is not null then
+    perform set_config('ivfflat.probes', match_probes::text, true);
+  end if;
+
+  return query
+  select
+    c.id,
+    c.course_id,
+    c.file_id,
+    c.chunk_index,
+    c.content,
+    cf.filename,
+    1 - (c.embedding <=> query_embedding::halfvec) as similarity,
+    case when match_with_embeddings then c.embedding end
+  from chunks c
+  join course_files cf on c.file_id = cf.id and cf.course_id = match_course_id
+  where c.course_id = match_course_id
+  order by c.embedding <=> query_embedding::halfvec
+  limit match_count;
+end;
+$$;
+
+create or replace function match_chunks_hybrid(
+  query_embedding vector,
+  query_text text,
+  match_course_id uuid,
+  match_count int default 5,
+  match_candidates int default 40,
+  rrf_k int default 60,
+  match_ef_search int default null,
+  match_probes int default null,
+  match_with_embeddings boolean default false
+)
+returns table (
+  id uuid,
+  course_id uuid,
+  file_id uuid,
+  chunk_index int,
+  content text,
+  filename text,
+  similarity float,
+  vector_rank int,
+  lexical_rank int,
+  score float,
+  embedding halfvec
+)
+language plpgsql
+as $$
+#variable_conflict use_column
+declare
+  lexical_query tsquery;
+begin
+  if match_ef_search is not null then
+    perform set_config('hnsw.ef_search', match_ef_search::text, true);
+  end if;
+  if match_probes is not null then
+    perform set_config('ivfflat.probes', match_probes::text, true);
+  end if;
+
+  -- Null when every word is a stop word; the lexical list is then empty
+  lexical_query := nullif(
+    replace(plainto_tsquery('english', query_text)::text, '&', '|'), ''
+  )::tsquery;
+
+  return query
+  with vector_hits as (
+    select c.id, row_number() over (order by c.embedding <=> query_embedding::halfvec) as rank
+    from chunks c
+    where c.course_id = match_course_id
+    order by c.embedding <=> query_embedding::halfvec
+    limit match_candidates
+  ),
+  lexical_hits as (
+    select c.id, row_number() over (order by ts_rank_cd(c.content_tsv, lexical_query) desc) as rank
+    from chunks c
+    where c.course_id = match_course_id
+      and c.content_tsv @@ lexical_query
+    order by ts_rank_cd(c.content_tsv, lexical_query) desc
+    limit match_candidates
+  ),
+  fused as (
+    select
+      coalesce(v.id, l.id) as chunk_id,
+      v.rank as vector_rank,
+      l.rank as lexical_rank,
+      coalesce(1.0 / (rrf_k + v.rank), 0) + coalesce(1.0 / (rrf_k + l.rank), 0) as score
+    from vector_hits v
+    full outer join lexical_hits l on l.id = v.id
+  )
+  select
+    c.id,
+    c.course_id,
+    c.file_id,
+    c.chunk_index,
+    c.content,
+    cf.filename,
+    1 - (c.embedding <=> query_embedding::halfvec) as similarity,
+    f.vector_rank::int,
+    f.lexical_rank::int,
+    f.score::float,
+    case when match_with_embeddings then c.embedding end
+  from fused f
+  join chunks c on c.id = f.chunk_id and c.course_id = match_course_id
+  join course_files cf on c.file_id = cf.id and cf.course_id = match_course_id
+  order by f.score desc, f.vector_rank nulls last
+  limit match_count;
+end;
+$$;